@@ -0,0 +1,80 @@
+import math
+from collections import Counter
+from typing import Callable, Dict, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.retrievers.bm25 import default_preprocessing_func
+from pydantic import Field
+
+
+class IncrementalBM25Retriever(BaseRetriever):
+    """
+    문서 단위로 추가 / 수정 / 삭제할 수 있는 BM25 검색기
+
+    BM25Retriever 는 문서가 하나만 바뀌어도 전체 말뭉치로 다시 만들어야 하지만,
+    여기서는 단어별 posting (문서 id -> 단어 빈도) 과 문서 길이만 고쳐서 반영한다.
+    idf 는 음수가 되지 않도록 log(1 + (N - n + 0.5) / (n + 0.5)) 를 사용한다.
+
+    변경 메서드는 동시에 읽는 쪽과의 동기화를 하지 않으므로, 호출하는 쪽 (LabIndex) 이 잠금을 잡는다.
+    """
+
+    k: int = 4
+    k1: float = 1.5
+    b: float = 0.75
+    preprocess_func: Callable[[str], List[str]] = default_preprocessing_func
+    docs: Dict[str, Document] = Field(default_factory=dict)
+    postings: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    doc_lengths: Dict[str, int] = Field(default_factory=dict)
+    total_length: int = 0
+
+    @classmethod
+    def from_documents(cls, documents: List[Document], ids: List[str], **kwargs):
+        retriever = cls(**kwargs)
+        for doc_id, document in zip(ids, documents):
+            retriever.upsert(doc_id, document)
+        return retriever
+
+    def upsert(self, doc_id: str, document: Document):
+        if doc_id in self.docs:
+            self.delete(doc_id)
+
+        terms = Counter(self.preprocess_func(document.page_content))
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        self.docs[doc_id] = document
+        self.doc_lengths[doc_id] = sum(terms.values())
+        self.total_length += self.doc_lengths[doc_id]
+
+    def delete(self, doc_id: str):
+        if doc_id not in self.docs:
+            return
+
+        for term in set(self.preprocess_func(self.docs[doc_id].page_content)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        del self.docs[doc_id]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if not self.docs:
+            return []
+        num_docs = len(self.docs)
+        avg_length = max(self.total_length / num_docs, 1e-12)
+
+        # 질의 단어가 들어 있는 문서만 점수 계산
+        scores = Counter()
+        for term in self.preprocess_func(query):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (num_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, count in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * count * (self.k1 + 1) / (count + norm)
+
+        return [self.docs[doc_id] for doc_id, _ in scores.most_common(self.k)]
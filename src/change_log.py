@@ -0,0 +1,43 @@
+import json
+import os
+from typing import List, Tuple
+
+
+def append_change(path: str, entry: dict) -> Tuple[int, int]:
+    """
+    변경 기록 파일에 한 줄을 이어 쓰고 디스크에 반영한다. (파일 전체를 다시 쓰지 않음)
+    :return: 이 줄의 (시작, 끝) 위치 (다른 프로세스가 먼저 이어 썼으면 시작 위치가 그만큼 뒤)
+    """
+    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+    with open(path, "ab") as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+        end = f.tell()
+    return end - len(line), end
+
+
+def read_changes_from(path: str, offset: int = 0, end: int = None) -> Tuple[List[dict], int]:
+    """
+    offset 위치부터 (end 가 주어지면 end 전까지) 변경 기록을 순서대로 읽는다. 쓰다 중단된 마지막 줄은 무시한다.
+    :return: (기록, 마지막으로 읽은 줄의 끝 위치), 다음에는 이 위치부터 읽으면 된다.
+    """
+    if not os.path.exists(path):
+        return [], offset
+    entries = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if (end is not None and offset >= end) or not line.endswith(b"\n"):
+                break
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            offset += len(line)
+    return entries, offset
+
+
+def read_changes(path: str) -> List[dict]:
+    """변경 기록을 처음부터 순서대로 읽는다."""
+    return read_changes_from(path)[0]
@@ -0,0 +1,64 @@
+import threading
+import time
+
+
+class DeadlineExceeded(Exception):
+    """요청의 제한 시간이 지났거나 요청이 취소됨"""
+
+
+class Deadline:
+    """
+    요청 하나의 제한 시간 / 취소 상태
+
+    파이프라인의 각 단계에 전달되어, 외부 호출 전에 check() 로 확인하고
+    호출 timeout 을 remaining() 으로 제한하는 데 사용된다.
+    """
+
+    def __init__(self, timeout: float = None):
+        self.expires_at = time.monotonic() + timeout if timeout is not None else None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """요청 취소 (사용자가 다시 요청했거나 떠난 경우)"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> float:
+        """남은 시간 (초), 제한이 없으면 None"""
+        if self.cancelled:
+            return 0.0
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    def check(self):
+        if self.expired:
+            raise DeadlineExceeded("request cancelled" if self.cancelled else "request deadline exceeded")
+
+    def timeout(self, default: float = None) -> float:
+        """외부 호출에 넘길 timeout: 남은 시간과 default 중 작은 값"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return remaining if default is None else min(remaining, default)
+
+
+def check_deadline(deadline: Deadline = None):
+    """deadline 이 주어졌으면 확인한다. (deadline 은 항상 선택 인자)"""
+    if deadline is not None:
+        deadline.check()
+
+
+def call_timeout(deadline: Deadline = None, default: float = None) -> float:
+    """외부 호출 timeout (deadline 이 없으면 default)"""
+    if deadline is None:
+        return default
+    return deadline.timeout(default)
@@ -1,15 +1,18 @@
 import pandas as pd
+from deadline import check_deadline
 
-def find_topk(model, query, top_k=3):
+def find_topk(model, query, top_k=3, deadline=None):
     """
     Find the top k results based on the query using the provided model.
     
     :param model: The model to use for finding results.
     :param query: The query string to search for.
     :param top_k: The number of top results to return.
+    :param deadline: Optional request Deadline, checked before searching.
     :return: A DataFrame containing the top k results.
     """
     
+    check_deadline(deadline)
     retrieved_docs = model.invoke(query, top_k=top_k)
     # print(f"Retrieved {len(retrieved_docs)} documents.")
     if len(retrieved_docs) < top_k:
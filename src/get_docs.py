@@ -1,3 +1,43 @@
+import math
+
+
+def _get_value(row, column):
+    """열 값 (없거나 빈 값 / NaN 이면 "Unknown", ingest_catalog 의 normalize_row 와 같은 기준)"""
+    value = row.get(column)
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == "" or (isinstance(value, float) and math.isnan(value)):
+        return "Unknown"
+    return value
+
+
+def get_doc(row):
+    """
+    Converts a single lab row (pandas Series or dict) into a dictionary with 'index' and 'text' keys.
+    """
+    lab_info = {
+        "index": _get_value(row, "index"),
+        "research_institute": _get_value(row, "research_institute"),
+        "department": _get_value(row, "department"),
+        "lab_name": _get_value(row, "lab_name"),
+        "research_keywords": _get_value(row, "research_keywords"),
+        "research_topics": _get_value(row, "research_topics"),
+        "research_techniques": _get_value(row, "research_techniques"),
+        "lab_description": _get_value(row, "lab_description"),
+    }
+
+    return {
+        "index": lab_info["index"],
+        "text": f"Research Institute: {lab_info['research_institute']}\n"
+                f"Department: {lab_info['department']}\n"
+                f"Lab Name: {lab_info['lab_name']}\n"
+                f"Research Keywords: {lab_info['research_keywords']}\n"
+                f"Research Topics: {lab_info['research_topics']}\n"
+                f"Research Techniques: {lab_info['research_techniques']}\n"
+                f"Lab Description: {lab_info['lab_description']}\n"
+    }
+
+
 def get_docs(df):
     """
     Converts a DataFrame of lab info into a list of dictionaries with 'index' and 'text' keys.
@@ -6,29 +46,7 @@ def get_docs(df):
 
     for _, row in df.iterrows():
         try:
-            lab_info = {
-                "index": row.get("index", "Unknown"),
-                "research_institute": row.get("research_institute", "Unknown"),
-                "department": row.get("department", "Unknown"),
-                "lab_name": row.get("lab_name", "Unknown"),
-                "research_keywords": row.get("research_keywords", "Unknown"),
-                "research_topics": row.get("research_topics", "Unknown"),
-                "research_techniques": row.get("research_techniques", "Unknown"),
-                "lab_description": row.get("lab_description", "Unknown"),
-            }
-
-            lab_search_docs = {
-                "index": lab_info["index"],
-                "text": f"Research Institute: {lab_info['research_institute']}\n"
-                        f"Department: {lab_info['department']}\n"
-                        f"Lab Name: {lab_info['lab_name']}\n"
-                        f"Research Keywords: {lab_info['research_keywords']}\n"
-                        f"Research Topics: {lab_info['research_topics']}\n"
-                        f"Research Techniques: {lab_info['research_techniques']}\n"
-                        f"Lab Description: {lab_info['lab_description']}\n"
-            }
-
-            docs.append(lab_search_docs)
+            docs.append(get_doc(row))
 
         except Exception as e:
             print(f"Error processing row: {e}")
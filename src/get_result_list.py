@@ -2,18 +2,22 @@ import pandas as pd
 from typing import List, Dict
 import openai
 from langchain_openai import AzureChatOpenAI
+from llm_scheduler import get_scheduler, estimate_tokens
+from lab_cards import load_lab_cards, lab_row_hash, merge_card
+from deadline import DeadlineExceeded, call_timeout
 
 
-def get_final_prompt_list(recommendation_list: List[Dict], df: pd.DataFrame) -> List[str]:
+def get_final_prompt_list(recommendation_list: List[Dict], df: pd.DataFrame, start: int = 1) -> List[str]:
     """
     추천 결과와 연구실 데이터프레임을 받아 연구실별 출력 메시지 리스트 생성
+    start 는 첫 번째 연구실의 추천 순번 ("더 보기"로 이어서 생성할 때 사용)
     """
     messages = []
     if len(recommendation_list) == 0:
         print("Warning: No recommendations found.")
         return messages
    
-    for idx, r in enumerate(recommendation_list, start=1):
+    for idx, r in enumerate(recommendation_list, start=start):
         
         df1 = df[df['index'].astype(int) == int(r['index'])]
 
@@ -82,12 +86,27 @@ def get_final_prompt_list(recommendation_list: List[Dict], df: pd.DataFrame) ->
     return messages
 
 
-def final_prompts_output(recommendation_list: List[Dict], df: pd.DataFrame) -> str:
-    
-    messages = get_final_prompt_list(recommendation_list, df)
+def final_prompts_output(recommendation_list: List[Dict], df: pd.DataFrame, start: int = 1, deadline=None) -> str:
+    """
+    추천 결과별 최종 출력 생성
+    deadline 이 지나면 남은 호출은 하지 않고 완료된 결과만 반환한다.
+    """
+    lab_cards = load_lab_cards()
     final_result_list = []
 
-    for idx, message in enumerate(messages, start=1):
+    for idx, r in enumerate(recommendation_list, start=start):
+        df1 = df[df['index'].astype(int) == int(r['index'])]
+        if df1.empty:
+            print(f"Warning: No data found for index {r['index']}")
+            continue
+
+        # 미리 생성한 카드가 최신이면 recommend_lab 이 만든 추천 이유를 그대로 합친다 (추가 호출 없음)
+        card = lab_cards.get(str(int(r['index'])))
+        if card and card["hash"] == lab_row_hash(df1.iloc[0]):
+            final_result_list.append(merge_card(card["card"], idx, r['recommendation_reason']))
+            continue
+
+        message = get_final_prompt_list([r], df, start=idx)[0]
         final_prompt = f"""
         ### 역할 ###
         당신은 대학원 진학을 희망하는 학생에게 연구실을 추천하는 조력자입니다.
@@ -110,12 +129,18 @@ def final_prompts_output(recommendation_list: List[Dict], df: pd.DataFrame) -> s
         과장 없이 핵심 정보를 요약하되, 정보 전달이 명확하도록 구성하시오.
         """
 
-        # LLM에게 lab_info_prompt를 전달하여 추천 이유 생성
-        model = AzureChatOpenAI(model='gpt-4o')
-        response = model.invoke(final_prompt)
+        # LLM에게 lab_info_prompt를 전달하여 추천 이유 생성 (재시도/속도 제한은 스케줄러가 담당)
+        try:
+            response = get_scheduler().call(
+                lambda: AzureChatOpenAI(model='gpt-4o', max_retries=0, timeout=call_timeout(deadline)).invoke(final_prompt),
+                estimated_tokens=estimate_tokens(final_prompt),
+                deadline=deadline,
+            )
+        except DeadlineExceeded:
+            print("⏱️ 요청 제한 시간이 지나 완료된 추천만 반환합니다.")
+            break
         response_text = response.content
 
         final_result_list.append(response_text)
 
-
     return final_result_list
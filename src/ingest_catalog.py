@@ -0,0 +1,242 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from get_docs import get_doc
+from ivf_index import IVFIndex, clear_index_overrides, docs_fingerprint, update_fingerprint
+from load_embeddings import embedding_id, load_embeddings
+
+# catalog.csv 에 기록하는 열 (get_result_list 가 사용하는 열과 동일)
+CATALOG_COLUMNS = [
+    "index", "professor_name", "research_institute", "department", "degree", "professor_title",
+    "lab_name", "lab_website", "research_keywords", "professoer_career", "telephone", "fax", "email",
+    "research_topics", "research_techniques", "lab_description", "recent_publications",
+]
+
+REQUIRED_COLUMNS = ["index", "lab_name"]
+
+# output_dir 안의 정규화된 카탈로그 파일 이름 (lab_catalog 가 IVF_INDEX_DIR 옆에서 찾는다)
+CATALOG_FILE = "catalog.csv"
+
+
+def iter_source_rows(path: str) -> Iterator[Tuple[int, dict]]:
+    """
+    xlsx / csv 파일을 한 행씩 읽는다. (파일 전체를 메모리에 올리지 않음)
+    :return: (행 번호, {열 이름: 값}) 제너레이터
+    """
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(h).strip().lower() if h is not None else "" for h in next(rows, [])]
+            for row_number, values in enumerate(rows, start=2):
+                yield row_number, dict(zip(header, values))
+        finally:
+            workbook.close()
+
+    elif path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            for row_number, row in enumerate(reader, start=2):
+                yield row_number, {(k or "").strip().lower(): v for k, v in row.items()}
+
+    else:
+        raise ValueError(f"Unsupported catalog source: {path}")
+
+
+def normalize_row(row: dict) -> Tuple[dict, str]:
+    """
+    행의 값을 정리한다. 빈 값은 제거해 get_doc 의 기본값("Unknown")이 쓰이도록 한다.
+    :return: (정리된 행, None) 또는 (None, 거부 사유)
+    """
+    lab = {}
+    for key, value in row.items():
+        if not key:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == "":
+            continue
+        lab[key] = value
+
+    for column in REQUIRED_COLUMNS:
+        if column not in lab:
+            return None, f"missing required column '{column}'"
+
+    # index 는 정수여야 한다 (엑셀에서 3.0 으로 읽히는 경우 포함)
+    try:
+        index = float(lab["index"])
+    except (TypeError, ValueError):
+        return None, f"invalid index {lab['index']!r}"
+    if not index.is_integer():
+        return None, f"invalid index {lab['index']!r}"
+    lab["index"] = int(index)
+
+    return lab, None
+
+
+def read_catalog_docs(path: str) -> List[dict]:
+    """ingest_catalog 와 같은 방식 (normalize_row + get_doc) 으로 검색 문서를 만든다. (인덱스 지문과 일치)"""
+    docs = []
+    for _, row in iter_source_rows(path):
+        lab, _ = normalize_row(row)
+        if lab is not None:
+            docs.append(get_doc(lab))
+    return docs
+
+
+def _make_batches(docs: List[dict], batch_size: int, max_batch_chars: int) -> List[List[dict]]:
+    """문서 수와 글자 수 모두 상한을 넘지 않도록 배치를 나눈다."""
+    batches, batch, chars = [], [], 0
+    for doc in docs:
+        if batch and (len(batch) >= batch_size or chars + len(doc["text"]) > max_batch_chars):
+            batches.append(batch)
+            batch, chars = [], 0
+        batch.append(doc)
+        chars += len(doc["text"])
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _embed_batch(embeddings, batch: List[dict], max_retries: int) -> List[List[float]]:
+    for attempt in range(max_retries + 1):
+        try:
+            return embeddings.embed_documents([doc["text"] for doc in batch])
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            print(f"Embedding batch failed ({e}), retrying...")
+            time.sleep(2 ** attempt)
+
+
+def embed_docs(embeddings, docs: List[dict], executor: ThreadPoolExecutor, batch_size: int = 64,
+               max_batch_chars: int = 200000, max_retries: int = 3) -> np.ndarray:
+    """문서를 크기 제한이 있는 배치로 나누어 병렬로 임베딩한다."""
+    batches = _make_batches(docs, batch_size, max_batch_chars)
+    results = executor.map(lambda batch: _embed_batch(embeddings, batch, max_retries), batches)
+    return np.asarray([vector for vectors in results for vector in vectors], dtype=np.float32)
+
+
+def _write_shard(shard_dir: str, vectors: np.ndarray, ids: List[int], texts: List[str], embedding_model: str) -> int:
+    """(워커 프로세스) 샤드 하나의 IVF 인덱스를 학습하고 저장한다."""
+    IVFIndex.build(vectors, ids, texts).save(shard_dir, embedding_model=embedding_model)
+    return len(ids)
+
+
+def ingest_catalog(sources: List[str], output_dir: str, shard_size: int = 50000, batch_size: int = 64,
+                   embed_workers: int = 4, shard_workers: int = 2, embedding_backend: str = None) -> Dict:
+    """
+    Build a sharded IVF index and a normalized catalog.csv from many xlsx/csv sources.
+
+    Rows are streamed, normalized and deduplicated by index; rejected rows are
+    recorded in report.json instead of being skipped silently.
+
+    :return: The ingestion report.
+    """
+    started = time.time()
+    index_dir = os.path.join(output_dir, "index")
+    os.makedirs(index_dir, exist_ok=True)
+
+    embeddings = load_embeddings(embedding_backend)
+    embedding_model = embedding_id(embedding_backend)
+    dim = None       # 임베딩 차원 (첫 샤드에서 확인)
+    seen = {}        # index -> 처음 나온 위치
+    fingerprint = docs_fingerprint([], [])  # 인덱스 지문 (문서를 하나씩 더한다)
+    rejected = []
+    shards = []
+    pending = set()  # 아직 저장 중인 샤드 (메모리 사용량 제한을 위해 shard_workers 개까지만)
+    shard_docs = []
+
+    with open(os.path.join(output_dir, CATALOG_FILE), "w", newline="", encoding="utf-8") as catalog_file, \
+            ThreadPoolExecutor(max_workers=embed_workers) as embed_executor, \
+            ProcessPoolExecutor(max_workers=shard_workers) as shard_executor:
+        writer = csv.DictWriter(catalog_file, fieldnames=CATALOG_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+
+        def flush_shard():
+            nonlocal pending, dim
+            if not shard_docs:
+                return
+            vectors = embed_docs(embeddings, shard_docs, embed_executor, batch_size=batch_size)
+            dim = int(vectors.shape[1])
+            while len(pending) >= shard_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()  # 샤드 저장 실패는 여기서 작업 전체를 실패시킨다
+
+            shard_name = f"shard_{len(shards):05d}"
+            shards.append(shard_name)
+            pending.add(shard_executor.submit(
+                _write_shard, os.path.join(index_dir, shard_name), vectors,
+                [doc["index"] for doc in shard_docs], [doc["text"] for doc in shard_docs], embedding_model,
+            ))
+            print(f"✅ {shard_name}: {len(shard_docs)}개 연구실 임베딩 완료")
+            shard_docs.clear()
+
+        for source in sources:
+            for row_number, row in iter_source_rows(source):
+                location = f"{source}:{row_number}"
+                lab, reason = normalize_row(row)
+                if lab is not None and lab["index"] in seen:
+                    lab, reason = None, f"duplicate index {lab['index']} (first seen at {seen[lab['index']]})"
+                if lab is None:
+                    rejected.append({"source": source, "row": row_number, "reason": reason})
+                    continue
+
+                seen[lab["index"]] = location
+                writer.writerow(lab)
+                shard_docs.append(get_doc(lab))
+                fingerprint = update_fingerprint(fingerprint, added=[(lab["index"], shard_docs[-1]["text"])])
+                if len(shard_docs) >= shard_size:
+                    flush_shard()
+
+        flush_shard()
+        for future in pending:
+            future.result()
+
+    with open(os.path.join(index_dir, "manifest.json"), "w") as f:
+        json.dump({"shards": shards, "fingerprint": fingerprint, "embedding_model": embedding_model, "dim": dim}, f)
+    clear_index_overrides(index_dir)  # 이전 인덱스에 대한 연구실 단위 변경은 새 샤드에 이미 반영됨
+
+    report = {
+        "sources": sources,
+        "accepted": len(seen),
+        "rejected_count": len(rejected),
+        "rejected": rejected,
+        "shards": shards,
+        "elapsed_seconds": round(time.time() - started, 2),
+    }
+    with open(os.path.join(output_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a sharded lab index from xlsx/csv catalog files.")
+    parser.add_argument("sources", nargs="+", help="xlsx or csv catalog files")
+    parser.add_argument("--output-dir", default="./data/catalog")
+    parser.add_argument("--shard-size", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--embed-workers", type=int, default=4)
+    parser.add_argument("--shard-workers", type=int, default=2)
+    parser.add_argument("--embedding-backend", default=None)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    result = ingest_catalog(
+        args.sources, args.output_dir, shard_size=args.shard_size, batch_size=args.batch_size,
+        embed_workers=args.embed_workers, shard_workers=args.shard_workers, embedding_backend=args.embedding_backend,
+    )
+    print(f"✅ {result['accepted']}개 연구실 처리, {result['rejected_count']}개 행 거부 "
+          f"({result['elapsed_seconds']}초) → {args.output_dir}/report.json")
@@ -0,0 +1,491 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import Field
+from change_log import append_change, read_changes
+
+
+# 인덱스 디렉터리에 연구실 단위 변경 (추가/수정/삭제) 을 이어 쓰는 파일
+OVERRIDES_FILE = "overrides.jsonl"
+
+_FINGERPRINT_MODULUS = 1 << 256
+
+
+def _doc_digest(lab_index: int, text: str) -> int:
+    return int.from_bytes(hashlib.sha256(f"{int(lab_index)}\t{text}".encode("utf-8")).digest(), "big")
+
+
+def update_fingerprint(fingerprint: dict, added=(), removed=()) -> dict:
+    """
+    문서 집합의 지문 (순서와 무관): 문서 수 + 문서별 (index, text) 해시의 합
+
+    합이므로 문서를 더하거나 뺀 지문을 전체를 다시 읽지 않고 계산할 수 있다.
+    저장된 인덱스가 현재 카탈로그로 만든 것인지 확인하는 데 사용한다.
+
+    :param added: 추가할 (연구실 index, 문서) 목록
+    :param removed: 뺄 (연구실 index, 문서) 목록
+    """
+    total, count = int(fingerprint["hash"], 16), fingerprint["count"]
+    for lab_index, text in added:
+        total += _doc_digest(lab_index, text)
+        count += 1
+    for lab_index, text in removed:
+        total -= _doc_digest(lab_index, text)
+        count -= 1
+    return {"count": count, "hash": f"{total % _FINGERPRINT_MODULUS:064x}"}
+
+
+def docs_fingerprint(ids, texts) -> dict:
+    return update_fingerprint({"count": 0, "hash": "0"}, added=zip(ids, texts))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """각 벡터를 가장 가까운(코사인) centroid 에 할당"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def _train_centroids(vectors: np.ndarray, nlist: int, iters: int, seed: int) -> np.ndarray:
+    """샘플에 대해 spherical k-means 로 coarse centroid 학습"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * 256)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+
+        # 비어 있는 cluster 는 임의의 샘플로 다시 초기화
+        empty = np.bincount(assignments, minlength=nlist) == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = _normalize(sums)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    IVF (coarse partitioning) + int8 스칼라 양자화 근사 최근접 이웃 인덱스
+
+    - 메모리에는 int8 코드와 centroid 만 올리고, float32 원본 벡터는 디스크(memmap)에 둔다.
+    - 검색 시 nprobe 개의 partition 만 int8 로 훑은 뒤, 상위 후보를 원본 벡터로 재정렬한다.
+    """
+
+    def __init__(self, centroids, scales, codes, offsets, ids, vectors, texts=None, path=None):
+        self.centroids = centroids    # (nlist, dim) float32
+        self.scales = scales          # (dim,) float32, 차원별 양자화 스케일
+        self.codes = codes            # (n, dim) int8, partition 순으로 정렬
+        self.offsets = offsets        # (nlist + 1,) partition 별 시작 위치
+        self.ids = ids                # (n,) int64, 연구실 index
+        self.vectors = vectors        # (n, dim) float32, 재정렬용 원본 벡터 (memmap 가능)
+        self.texts = texts            # 저장 전에는 메모리의 문서 리스트
+        self.path = path
+        self._doc_offsets = None
+        self._id_order = None         # ids 의 정렬 순서 (find_rows 에서 처음 사용할 때 계산)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, ids, texts: List[str], nlist: int = None, iters: int = 10, seed: int = 0):
+        """벡터로 centroid 를 학습하고 인덱스를 생성한다."""
+        vectors = _normalize(vectors)
+        ids = np.asarray(ids, dtype=np.int64)
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+
+        centroids = _train_centroids(vectors, nlist, iters, seed)
+        assignments = _assign(vectors, centroids)
+
+        # partition 순서로 정렬해 partition 마다 연속된 구간을 갖도록 한다
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+
+        vectors = vectors[order]
+        scales = np.clip(np.abs(vectors).max(axis=0) / 127.0, 1e-12, None).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+
+        return cls(centroids, scales, codes, offsets, ids[order], vectors, texts=[texts[i] for i in order])
+
+    def search(self, query, k: int, nprobe: int = 8, rerank_factor: int = 4) -> List[Tuple[int, float]]:
+        """
+        Return up to k (row, score) pairs for the query vector.
+
+        :param nprobe: Number of partitions to scan; higher is slower but has better recall.
+        :param rerank_factor: k * rerank_factor int8 candidates are rescored with full-precision vectors.
+        """
+        if len(self) == 0:
+            return []
+        query = _normalize(query)
+
+        # 1. 가까운 partition nprobe 개 선택
+        nprobe = min(nprobe, self.nlist)
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([np.arange(self.offsets[p], self.offsets[p + 1]) for p in probe])
+        if len(rows) == 0:
+            return []
+
+        # 2. int8 코드로 근사 점수 계산: (codes * scales) · q = codes · (q * scales)
+        approx = self.codes[rows].astype(np.float32) @ (query * self.scales)
+        n_candidates = min(len(rows), k * max(rerank_factor, 1))
+        candidates = np.sort(rows[np.argpartition(-approx, n_candidates - 1)[:n_candidates]])
+
+        # 3. 후보만 원본 float32 벡터로 재정렬 (memmap 은 필요한 행만 읽음)
+        exact = np.asarray(self.vectors[candidates]) @ query
+        top = np.argsort(-exact)[:k]
+        return [(int(candidates[i]), float(exact[i])) for i in top]
+
+    def exact_search(self, query, k: int, chunk_size: int = 65536) -> List[int]:
+        """원본 벡터 전체를 훑는 정확한 검색 (recall 측정용)"""
+        query = _normalize(query)
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), chunk_size):
+            scores[start:start + chunk_size] = np.asarray(self.vectors[start:start + chunk_size]) @ query
+        k = min(k, len(self))
+        return np.argpartition(-scores, k - 1)[:k].tolist()
+
+    def estimate_recall(self, queries, k: int, nprobe: int = 8, rerank_factor: int = 4) -> float:
+        """샘플 질의에 대한 recall@k 를 측정해 nprobe / rerank_factor 조정에 사용한다."""
+        hits, total = 0, 0
+        for query in queries:
+            truth = set(self.exact_search(query, k))
+            found = {row for row, _ in self.search(query, k, nprobe=nprobe, rerank_factor=rerank_factor)}
+            hits += len(truth & found)
+            total += len(truth)
+        return hits / total if total else 1.0
+
+    def find_rows(self, lab_indexes) -> np.ndarray:
+        """연구실 index 들의 행 위치 (없는 연구실은 -1)"""
+        lab_indexes = np.asarray(lab_indexes, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(len(lab_indexes), -1, dtype=np.int64)
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind="stable")
+        positions = np.clip(np.searchsorted(self.ids, lab_indexes, sorter=self._id_order), 0, len(self) - 1)
+        rows = self._id_order[positions]
+        return np.where(self.ids[rows] == lab_indexes, rows, -1)
+
+    def iter_texts(self) -> Iterator[str]:
+        """행 순서대로 문서 (저장된 인덱스는 docs.jsonl 을 처음부터 읽는다)"""
+        if self.texts is not None:
+            yield from self.texts
+            return
+        with open(os.path.join(self.path, "docs.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)["text"]
+
+    def patched(self, removed, added=()) -> "IVFIndex":
+        """
+        연구실을 빼고 (removed: 연구실 index 목록) 추가한 (added: (연구실 index, 벡터, 문서) 목록) 새 인덱스
+        centroid 와 양자화 스케일은 그대로 두고, 추가된 벡터는 가장 가까운 partition 에 넣는다.
+        """
+        keep = ~np.isin(self.ids, np.asarray(list(removed), dtype=np.int64))
+        partitions = np.repeat(np.arange(self.nlist), np.diff(self.offsets))[keep]
+        ids, codes = self.ids[keep], self.codes[keep]
+        vectors = np.asarray(self.vectors[np.nonzero(keep)[0]], dtype=np.float32)
+        texts = [text for text, kept in zip(self.iter_texts(), keep) if kept]
+
+        if added:
+            added_vectors = _normalize([vector for _, vector, _ in added])
+            partitions = np.concatenate([partitions, _assign(added_vectors, self.centroids)])
+            ids = np.concatenate([ids, np.asarray([lab_index for lab_index, _, _ in added], dtype=np.int64)])
+            codes = np.concatenate([codes, np.clip(np.rint(added_vectors / self.scales), -127, 127).astype(np.int8)])
+            vectors = np.concatenate([vectors, added_vectors])
+            texts += [text for _, _, text in added]
+
+        order = np.argsort(partitions, kind="stable")
+        offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(partitions, minlength=self.nlist))
+        return IVFIndex(self.centroids, self.scales, codes[order], offsets, ids[order], vectors[order],
+                        texts=[texts[i] for i in order])
+
+    def get_text(self, row: int) -> str:
+        if self.texts is not None:
+            return self.texts[row]
+
+        # 저장된 인덱스는 docs.jsonl 에서 필요한 줄만 읽는다
+        with open(os.path.join(self.path, "docs.jsonl"), "rb") as f:
+            f.seek(int(self._doc_offsets[row]))
+            return json.loads(f.readline())["text"]
+
+    def save(self, path: str, embedding_model: str = None):
+        """
+        :param embedding_model: 벡터를 만든 임베딩 모델 (load_embeddings.embedding_id), 다른 모델의 질의 벡터로 검색하지 않도록 기록
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "centroids.npy"), self.centroids)
+        np.save(os.path.join(path, "scales.npy"), self.scales)
+        np.save(os.path.join(path, "codes.npy"), self.codes)
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        np.save(os.path.join(path, "ids.npy"), self.ids)
+        np.save(os.path.join(path, "vectors.npy"), np.asarray(self.vectors, dtype=np.float32))
+
+        doc_offsets = np.zeros(len(self), dtype=np.int64)
+        with open(os.path.join(path, "docs.jsonl"), "wb") as f:
+            for row in range(len(self)):
+                doc_offsets[row] = f.tell()
+                line = json.dumps({"index": int(self.ids[row]), "text": self.get_text(row)}, ensure_ascii=False)
+                f.write(line.encode("utf-8") + b"\n")
+        np.save(os.path.join(path, "doc_offsets.npy"), doc_offsets)
+
+        fingerprint = docs_fingerprint(self.ids, [self.get_text(row) for row in range(len(self))])
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"size": len(self), "dim": int(self.centroids.shape[1]), "nlist": self.nlist,
+                       "fingerprint": fingerprint, "embedding_model": embedding_model}, f)
+
+    @classmethod
+    def load(cls, path: str):
+        """int8 코드는 메모리로, float32 원본 벡터는 memmap 으로 로드한다."""
+        index = cls(
+            centroids=np.load(os.path.join(path, "centroids.npy")),
+            scales=np.load(os.path.join(path, "scales.npy")),
+            codes=np.load(os.path.join(path, "codes.npy")),
+            offsets=np.load(os.path.join(path, "offsets.npy")),
+            ids=np.load(os.path.join(path, "ids.npy")),
+            vectors=np.load(os.path.join(path, "vectors.npy"), mmap_mode="r"),
+            path=path,
+        )
+        index._doc_offsets = np.load(os.path.join(path, "doc_offsets.npy"))
+        return index
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return path is not None and os.path.exists(os.path.join(path, "meta.json"))
+
+
+def _shard_dirs(path: str) -> List[str]:
+    """manifest.json 이 있으면 샤드 디렉터리 목록, 없으면 path 자체가 단일 인덱스"""
+    manifest_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return [path]
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return [os.path.join(path, shard) for shard in manifest["shards"]]
+
+
+def load_index_shards(path: str) -> List[IVFIndex]:
+    """path 의 인덱스 (ingest_catalog 의 샤드 또는 단일 인덱스) 를 불러온다."""
+    return [IVFIndex.load(shard_dir) for shard_dir in _shard_dirs(path)]
+
+
+def load_index_overrides(path: str) -> Dict[int, Optional[Tuple[np.ndarray, str]]]:
+    """save_override 로 저장된 연구실 단위 변경 (같은 연구실은 마지막 변경이 적용된다)"""
+    overrides = {}
+    for entry in read_changes(os.path.join(path, OVERRIDES_FILE)):
+        if entry.get("deleted"):
+            overrides[int(entry["index"])] = None
+        else:
+            overrides[int(entry["index"])] = (_normalize(entry["vector"]), entry["text"])
+    return overrides
+
+
+def clear_index_overrides(path: str):
+    """인덱스를 다시 만들면 이전 변경 기록은 필요 없다."""
+    overrides_path = os.path.join(path, OVERRIDES_FILE)
+    if os.path.exists(overrides_path):
+        os.remove(overrides_path)
+
+
+def overridden_fingerprint(fingerprint: dict, indexes: List[IVFIndex], overrides: dict) -> dict:
+    """샤드의 지문에 overrides (추가/수정/삭제) 를 반영한 지문"""
+    if not overrides:
+        return fingerprint
+
+    ids = np.fromiter(overrides, dtype=np.int64)
+    removed = []
+    for index in indexes:
+        for row in np.nonzero(np.isin(index.ids, ids))[0]:
+            removed.append((int(index.ids[row]), index.get_text(row)))
+    added = [(lab_index, override[1]) for lab_index, override in overrides.items() if override is not None]
+    return update_fingerprint(fingerprint, added=added, removed=removed)
+
+
+def load_index_meta(path: str) -> dict:
+    """저장된 인덱스의 정보 (manifest.json 또는 meta.json 의 fingerprint, embedding_model, dim), 없으면 빈 dict"""
+    for name in ("manifest.json", "meta.json"):
+        meta_path = os.path.join(path, name)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                return json.load(f)
+    return {}
+
+
+def stage_index_overrides(path: str, indexes: List[IVFIndex], overrides: dict) -> List[Tuple[int, str]]:
+    """
+    overrides 를 합친 샤드를 임시 디렉터리 (샤드 디렉터리 + ".tmp") 에 저장한다. (바뀐 연구실이 있는 샤드만)
+    수정 / 삭제된 연구실은 원래 샤드에서 고치고, 새 연구실은 가장 작은 샤드에 넣는다.
+
+    :return: 다시 저장한 (샤드 위치, 임시 디렉터리) 목록, commit_index_overrides 에 넘긴다.
+    """
+    shard_dirs = _shard_dirs(path)
+    ids = np.fromiter(overrides, dtype=np.int64)
+    removed = {position: [] for position in range(len(indexes))}
+    added = {position: [] for position in range(len(indexes))}
+    placed = set()
+
+    for position, index in enumerate(indexes):
+        for lab_index in ids[index.find_rows(ids) >= 0].tolist():
+            removed[position].append(lab_index)
+            if overrides[lab_index] is not None:
+                added[position].append(lab_index)
+                placed.add(lab_index)
+    smallest = int(np.argmin([len(index) for index in indexes]))
+    for lab_index, override in overrides.items():
+        if override is not None and lab_index not in placed:
+            added[smallest].append(lab_index)
+
+    staged = []
+    for position, index in enumerate(indexes):
+        if not removed[position] and not added[position]:
+            continue
+        patched = index.patched(removed[position], [(i, *overrides[i]) for i in added[position]])
+        tmp_dir = f"{os.path.normpath(shard_dirs[position])}.tmp"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        patched.save(tmp_dir, embedding_model=load_index_meta(shard_dirs[position]).get("embedding_model"))
+        staged.append((position, tmp_dir))
+    return staged
+
+
+def commit_index_overrides(path: str, indexes: List[IVFIndex], overrides: dict, staged: List[Tuple[int, str]]) -> List[IVFIndex]:
+    """
+    stage_index_overrides 로 저장한 샤드로 교체하고 overrides 를 비운 뒤 인덱스를 다시 불러온다.
+    교체 전의 indexes 는 더 이상 사용할 수 없으므로, 호출하는 쪽이 검색을 막은 상태에서 호출한다.
+    (도중에 중단되면 저장된 지문과 맞지 않아 load_ivf_retriever 가 다시 생성하거나 오류를 낸다)
+    """
+    manifest_path = os.path.join(path, "manifest.json")
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        # 교체하면 이전 문서를 읽을 수 없으므로 먼저 계산
+        if manifest.get("fingerprint") is not None:
+            manifest["fingerprint"] = overridden_fingerprint(manifest["fingerprint"], indexes, overrides)
+
+    shard_dirs = _shard_dirs(path)
+    for position, tmp_dir in staged:
+        shard_dir = os.path.normpath(shard_dirs[position])
+        old_dir = f"{shard_dir}.old"
+        os.rename(shard_dir, old_dir)
+        os.rename(tmp_dir, shard_dir)
+        shutil.rmtree(old_dir)
+
+    if manifest is not None:
+        with open(f"{manifest_path}.tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+    clear_index_overrides(path)
+    return load_index_shards(path)
+
+
+def index_exists(path: str) -> bool:
+    return path is not None and (IVFIndex.exists(path) or os.path.exists(os.path.join(path, "manifest.json")))
+
+
+class IVFRetriever(BaseRetriever):
+    """
+    하나 이상의 IVFIndex (샤드) 를 LangChain retriever 로 감싼다.
+
+    overrides 는 샤드를 다시 만들지 않고 반영한 연구실 단위 변경이다.
+    {연구실 index: (정규화된 벡터, 문서)} 는 추가/수정, {연구실 index: None} 은 삭제이며,
+    샤드에 있는 같은 index 의 항목은 검색에서 가려진다. (ingest_catalog 로 다시 만들면 비워진다)
+    """
+
+    indexes: List[IVFIndex]
+    embeddings: Embeddings
+    k: int = 3
+    nprobe: int = 8
+    rerank_factor: int = 4
+    overrides: Dict[int, Optional[Tuple[np.ndarray, str]]] = Field(default_factory=dict)
+    path: Optional[str] = None   # 인덱스 디렉터리 (있으면 save_override 로 변경을 저장)
+
+    def upsert(self, lab_index: int, vector, text: str):
+        # 읽는 쪽이 보고 있는 dict 는 건드리지 않고 새 dict 로 교체
+        self.overrides = {**self.overrides, int(lab_index): (_normalize(vector), text)}
+
+    def delete(self, lab_index: int):
+        self.overrides = {**self.overrides, int(lab_index): None}
+
+    def save_override(self, lab_index: int):
+        """연구실 하나의 현재 변경을 인덱스 디렉터리에 이어 쓴다. (재시작하면 load_index_overrides 로 복원)"""
+        if self.path is None:
+            return
+        override = self.overrides[int(lab_index)]
+        if override is None:
+            entry = {"index": int(lab_index), "deleted": True}
+        else:
+            entry = {"index": int(lab_index), "text": override[1], "vector": override[0].tolist()}
+        append_change(os.path.join(self.path, OVERRIDES_FILE), entry)
+
+    def search_vector(self, vector, k: int) -> List[Tuple[float, int, Optional[IVFIndex], Optional[int], Optional[str]]]:
+        """
+        벡터에 가까운 연구실 k 개를 점수순으로 반환한다.
+        :return: (점수, 연구실 index, 샤드, 행, 변경된 문서) 목록 (변경된 연구실은 샤드 / 행이 None)
+        """
+        overrides = self.overrides
+
+        # 샤드별 top-k 를 모아 점수순으로 병합 (가려진 항목만큼 더 가져온다)
+        results = []
+        for index in self.indexes:
+            for row, score in index.search(vector, k + len(overrides), nprobe=self.nprobe,
+                                           rerank_factor=self.rerank_factor):
+                if int(index.ids[row]) not in overrides:
+                    results.append((score, int(index.ids[row]), index, row, None))
+
+        # 변경된 연구실은 정확한 점수로 함께 비교
+        vector = _normalize(vector)
+        for lab_index, override in overrides.items():
+            if override is not None:
+                override_vector, text = override
+                results.append((float(override_vector @ vector), lab_index, None, None, text))
+        results.sort(key=lambda result: -result[0])
+        return results[:k]
+
+    def get_vector(self, lab_index: int) -> Optional[np.ndarray]:
+        """연구실 하나의 정규화된 벡터 (memmap 에서 그 행만 읽는다), 없으면 None"""
+        overrides = self.overrides
+        if int(lab_index) in overrides:
+            override = overrides[int(lab_index)]
+            return override[0] if override is not None else None
+        for index in self.indexes:
+            row = int(index.find_rows([lab_index])[0])
+            if row >= 0:
+                return _normalize(index.vectors[row])
+        return None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        results = self.search_vector(self.embeddings.embed_query(query), self.k)
+        return [
+            Document(
+                page_content=index.get_text(row) if index is not None else text,
+                metadata={"index": lab_index, "score": score},
+            )
+            for score, lab_index, index, row, text in results
+        ]
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import pandas as pd
+from langchain_openai import AzureChatOpenAI
+from llm_scheduler import get_scheduler, estimate_tokens, BATCH
+
+# 미리 생성한 연구실 카드 저장 경로
+CARDS_PATH = "./data/lab_cards.json"
+
+# 카드 안에서 질의별 추천 이유가 들어갈 자리
+REASON_MARKER = "{{추천 이유}}"
+
+
+def lab_row_hash(row: pd.Series) -> str:
+    """연구실 행 내용의 해시 (행이 바뀌면 카드를 다시 생성)"""
+    content = json.dumps({str(k): str(v) for k, v in row.items()}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def card_prompt(message: str) -> str:
+    return f"""
+        ### 역할 ###
+        당신은 대학원 진학을 희망하는 학생에게 연구실을 소개하는 조력자입니다.
+        아래 연구실 정보를 바탕으로, 어떤 사용자 질의에도 재사용할 수 있는 연구실 소개 카드를 작성합니다.
+
+        ### 입력 ###
+        {message}
+
+        ### 출력 지침 ###
+        다음 항목을 포함하여 사용자에게 친절하고 신뢰감 있게 안내하시오:
+        - 연구실명, 교수명, 소속
+        - 연구 키워드와 주제, 사용 기술
+        - 추천 이유 자리에는 "📌 [추천 이유]" 줄과, 그 다음 줄에 {REASON_MARKER} 만 그대로 출력 (내용을 채우지 말 것)
+        - 연구실만의 특징, 교수 경력, 최근 논문 (이때 교수 학력, 경력, 논문은 원본 그대로 출력)
+        - 논문 갯수는 최대 5개로 제한
+        - 홈페이지 / 이메일 등 접근 수단
+        - 입력의 추천 순번은 출력하지 말 것
+
+        시각적 구분을 위해 줄바꿈 및 기호(●, 🔬, 📈 등)를 활용하시오.
+        과장 없이 핵심 정보를 요약하되, 정보 전달이 명확하도록 구성하시오.
+        """
+
+
+def merge_card(card: str, idx: int, reason: str) -> str:
+    """저장된 카드에 추천 순번과 질의별 추천 이유를 합친다."""
+    if REASON_MARKER in card:
+        body = card.replace(REASON_MARKER, reason)
+    else:
+        body = f"{card}\n\n📌 [추천 이유]\n{reason}"
+    return f"🔎 {idx}번째 추천 연구실\n\n{body}"
+
+
+@lru_cache(maxsize=1)
+def _load_lab_cards(path: str, modified_time: float) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_lab_cards(path: str = CARDS_PATH) -> dict:
+    """
+    Load the precomputed cards as {index: {"hash", "card"}}; empty if the job has not run.
+    """
+    if not os.path.exists(path):
+        return {}
+    return _load_lab_cards(path, os.path.getmtime(path))
+
+
+def _generate_card(df: pd.DataFrame, index: int) -> str:
+    from get_result_list import get_final_prompt_list  # get_result_list 가 이 모듈을 import 하므로 지연 import
+
+    message = get_final_prompt_list([{"index": index, "recommendation_reason": ""}], df)[0]
+    prompt = card_prompt(message)
+
+    model = AzureChatOpenAI(model='gpt-4o', max_retries=0)
+    response = get_scheduler().call(lambda: model.invoke(prompt), estimated_tokens=estimate_tokens(prompt), priority=BATCH)
+    return response.content
+
+
+def build_lab_cards(df: pd.DataFrame, path: str = CARDS_PATH, workers: int = 4) -> dict:
+    """
+    Precompute the query-independent card of every lab.
+
+    Only labs whose row hash changed (or that have no card yet) are regenerated,
+    and cards of labs no longer in the DataFrame are dropped.
+    """
+    old_cards = load_lab_cards(path)
+    cards = {}
+    stale = []
+
+    for _, row in df.iterrows():
+        key = str(int(row["index"]))
+        row_hash = lab_row_hash(row)
+        if key in old_cards and old_cards[key]["hash"] == row_hash:
+            cards[key] = old_cards[key]
+        else:
+            stale.append((key, row_hash))
+
+    print(f"🔄 {len(stale)}개 연구실 카드 생성 중... (재사용 {len(cards)}개)")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        generated = executor.map(lambda item: _generate_card(df, int(item[0])), stale)
+        for (key, row_hash), card in zip(stale, generated):
+            cards[key] = {"hash": row_hash, "card": card}
+
+    # 읽는 쪽이 쓰다 만 파일을 보지 않도록 임시 파일에 쓴 뒤 교체
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cards, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+    return cards
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from lab_catalog import default_catalog_path, read_catalog
+
+    load_dotenv()
+    # 서비스와 같은 카탈로그 (ingest_catalog 의 catalog.csv 또는 lab_info.xlsx + 변경 기록)
+    lab_total_info_df, _ = read_catalog(default_catalog_path())
+    result = build_lab_cards(lab_total_info_df)
+    print(f"✅ {len(result)}개 연구실 카드 저장 완료 → {CARDS_PATH}")
@@ -0,0 +1,244 @@
+import os
+import threading
+
+import pandas as pd
+from get_docs import get_docs
+from load_retriever import load_retriever
+from lab_index import LabIndex, delete_row, upsert_row
+from change_log import append_change, read_changes_from
+from ingest_catalog import CATALOG_FILE, read_catalog_docs
+
+# 연구실 데이터 경로
+DOC_PATH = "./data/lab_info.xlsx"
+
+# 질의마다 한 번에 검색해 두는 후보 연구실 수 ("더 보기"는 이 안에서 처리)
+CANDIDATE_POOL_SIZE = 10
+
+# 로드된 인덱스 {doc_path: LabIndex} (후보 수와 관계없이 카탈로그마다 하나)
+_lab_indexes = {}
+
+# 인덱스 생성 / 변경 반영은 하나씩 (변경 기록 순서가 뒤섞이지 않도록, upsert_lab 안에서 load_lab_index 를 부르므로 재진입 가능)
+_catalog_update_lock = threading.RLock()
+
+
+def default_catalog_path() -> str:
+    """
+    IVF 백엔드의 IVF_INDEX_DIR 이 ingest_catalog 결과 (output_dir/index) 이면 같은 output_dir 의 catalog.csv,
+    아니면 DOC_PATH
+    """
+    index_dir = os.getenv("IVF_INDEX_DIR")
+    if os.getenv("INDEX_BACKEND") == "ivf" and index_dir:
+        catalog_path = os.path.join(os.path.dirname(os.path.normpath(index_dir)), CATALOG_FILE)
+        if os.path.exists(catalog_path):
+            return catalog_path
+    return DOC_PATH
+
+
+def changes_path(doc_path: str) -> str:
+    """upsert_lab / delete_lab 변경 기록 파일 (예: lab_info.xlsx -> lab_info.changes.jsonl)"""
+    return f"{os.path.splitext(doc_path)[0]}.changes.jsonl"
+
+
+def _catalog_version(doc_path: str) -> float:
+    """카탈로그 파일 수정 시각 (compact_catalog 등으로 파일을 다시 쓰면 인덱스를 다시 만든다)"""
+    return os.path.getmtime(doc_path)
+
+
+def _log_size(doc_path: str) -> int:
+    log_path = changes_path(doc_path)
+    return os.path.getsize(log_path) if os.path.exists(log_path) else 0
+
+
+def _json_row(row) -> dict:
+    # numpy 값 (엑셀에서 읽은 행) 을 JSON 으로 저장할 수 있는 값으로
+    return {str(column): value.item() if hasattr(value, "item") else value for column, value in dict(row).items()}
+
+
+def read_catalog(doc_path: str):
+    """
+    연구실 DataFrame 과 검색 문서를 읽고, 아직 합치지 않은 변경 기록을 반영한다.
+    catalog.csv 는 샤드를 만들 때와 같은 방식으로 문서를 만들어, 저장된 인덱스와 내용이 일치하도록 한다.
+    """
+    lab_total_info_df, lab_search_docs, _ = _read_catalog(doc_path)
+    return lab_total_info_df, lab_search_docs
+
+
+def _read_catalog(doc_path: str):
+    """read_catalog + 반영한 변경 기록의 끝 위치"""
+    changes, log_offset = read_changes_from(changes_path(doc_path))
+    if doc_path.lower().endswith(".csv"):
+        lab_total_info_df, lab_search_docs = pd.read_csv(doc_path), read_catalog_docs(doc_path)
+    else:
+        lab_total_info_df, lab_search_docs = pd.read_excel(doc_path, engine='openpyxl'), None
+
+    for change in changes:
+        if change["op"] == "delete":
+            lab_total_info_df = delete_row(lab_total_info_df, change["index"])
+        else:
+            lab_total_info_df = upsert_row(lab_total_info_df, change["row"])
+
+    if lab_search_docs is None:
+        return lab_total_info_df, get_docs(lab_total_info_df), log_offset
+
+    # 바뀐 연구실만 DataFrame 행에서 문서를 다시 만든다 (LabIndex.upsert 와 같은 방식)
+    changed = {int(change["index"]) for change in changes}
+    lab_search_docs = [doc for doc in lab_search_docs if int(doc["index"]) not in changed]
+    lab_search_docs += get_docs(lab_total_info_df[lab_total_info_df['index'].astype(int).isin(changed)])
+    return lab_total_info_df, lab_search_docs, log_offset
+
+
+def _apply_change(lab_index: LabIndex, change: dict):
+    # 다른 프로세스가 기록한 변경 (그 프로세스가 이미 저장했으므로 persist 하지 않는다)
+    if change["op"] == "delete":
+        lab_index.delete(change["index"])
+    else:
+        lab_index.upsert(change["row"])
+
+
+def load_lab_index(doc_path: str = None, pool_size: int = CANDIDATE_POOL_SIZE) -> LabIndex:
+    """
+    Load the lab index (DataFrame + retriever), reusing it across requests.
+
+    The catalog is lab_info.xlsx, or ingest_catalog's catalog.csv when the IVF
+    backend points at ingested shards, plus the upsert_lab / delete_lab change log.
+    Entries that other processes append to the log are replayed one lab at a
+    time; the index is rebuilt only when the catalog file itself was rewritten.
+
+    One index is shared by all pool sizes of the same catalog; the retriever
+    returns the largest pool size requested so far and searches cut it to top_k.
+    """
+    doc_path = doc_path or default_catalog_path()
+    lab_index = _lab_indexes.get(doc_path)
+    if lab_index is None or lab_index.version != _catalog_version(doc_path) \
+            or lab_index.log_offset != _log_size(doc_path):
+        with _catalog_update_lock:
+            lab_index = _sync_lab_index(doc_path, pool_size)
+    lab_index.ensure_k(pool_size)
+    return lab_index
+
+
+def _sync_lab_index(doc_path: str, pool_size: int) -> LabIndex:
+    """인덱스를 카탈로그 파일 + 변경 기록과 맞춘다. (_catalog_update_lock 을 잡은 상태에서 호출)"""
+    version = _catalog_version(doc_path)
+    lab_index = _lab_indexes.get(doc_path)
+
+    # 파일은 그대로이고 변경 기록만 늘었으면 새 기록만 반영
+    if lab_index is not None and lab_index.version == version and _log_size(doc_path) >= lab_index.log_offset:
+        changes, log_offset = read_changes_from(changes_path(doc_path), lab_index.log_offset)
+        for change in changes:
+            _apply_change(lab_index, change)
+        lab_index.log_offset = log_offset
+        return lab_index
+
+    k = max(pool_size, lab_index.k) if lab_index is not None else pool_size
+    lab_total_info_df, lab_search_docs, log_offset = _read_catalog(doc_path)
+    search_model = load_retriever(lab_search_docs, k=k)
+    lab_index = LabIndex(lab_total_info_df, search_model, version, k=k)
+    lab_index.log_offset = log_offset
+    _lab_indexes[doc_path] = lab_index
+    return lab_index
+
+
+def load_catalog(doc_path: str = None, pool_size: int = CANDIDATE_POOL_SIZE):
+    """
+    Load the lab DataFrame and its retriever, reusing them across requests.
+
+    The returned retriever is the LabIndex itself, so searches are safe during upsert_lab / delete_lab.
+    """
+    lab_index = load_lab_index(doc_path, pool_size)
+    return lab_index.df, lab_index
+
+
+def load_lab_graph(doc_path: str = None, pool_size: int = CANDIDATE_POOL_SIZE) -> dict:
+    """
+    Load the precomputed lab-to-lab similarity graph (built offline with lab_graph.py).
+    """
+    return load_lab_index(doc_path, pool_size).get_graph()
+
+
+def _record_change(doc_path: str, change: dict, lab_index: LabIndex):
+    """
+    변경을 기록 파일에 이어 쓰고 (카탈로그 크기와 무관하게 한 줄), 인덱스가 반영한 위치를 그 뒤로 옮긴다.
+    그 사이에 다른 프로세스가 이어 쓴 변경은 함께 반영한다. (방금 고친 연구실은 이 기록이 더 나중이므로 제외)
+    """
+    start, end = append_change(changes_path(doc_path), change)
+    if start != lab_index.log_offset:
+        changes, _ = read_changes_from(changes_path(doc_path), lab_index.log_offset, end=start)
+        for other in changes:
+            if int(other["index"]) != change["index"]:
+                _apply_change(lab_index, other)
+    lab_index.log_offset = end
+
+
+def upsert_lab(row, doc_path: str = None, persist: bool = True) -> dict:
+    """
+    Add or update a single lab in the loaded index without a full rebuild.
+
+    :param row: Catalog columns (dict or pandas Series) including 'index'.
+    :param persist: Record the change (catalog change log + IVF overrides) so it survives a restart.
+    """
+    doc_path = doc_path or default_catalog_path()
+    row = _json_row(row)
+    with _catalog_update_lock:
+        lab_index = load_lab_index(doc_path)
+        doc = lab_index.upsert(row, persist=persist)
+        if persist:
+            _record_change(doc_path, {"op": "upsert", "index": int(row["index"]), "row": row}, lab_index)
+    return doc
+
+
+def delete_lab(index: int, doc_path: str = None, persist: bool = True) -> bool:
+    """
+    Delete a single lab from the loaded index without a full rebuild.
+
+    :param persist: Record the deletion so it survives a restart.
+    :return: False if no lab has this index.
+    """
+    doc_path = doc_path or default_catalog_path()
+    with _catalog_update_lock:
+        lab_index = load_lab_index(doc_path)
+        deleted = lab_index.delete(index, persist=persist)
+        if persist and deleted:
+            _record_change(doc_path, {"op": "delete", "index": int(index)}, lab_index)
+    return deleted
+
+
+def compact_catalog(doc_path: str = None):
+    """
+    Fold the change log into the catalog file (O(catalog), run offline or on a schedule).
+
+    The whole file is rewritten from the DataFrame, so formatting and extra sheets
+    of an xlsx are not kept. The IVF overrides and the graph change log are folded
+    into their index files as well (see LabIndex.compact).
+    """
+    doc_path = doc_path or default_catalog_path()
+    with _catalog_update_lock:
+        lab_index = load_lab_index(doc_path)
+        df = lab_index.df
+
+        # 읽는 쪽이 쓰다 만 파일을 보지 않도록 임시 파일에 쓴 뒤 교체
+        root, extension = os.path.splitext(doc_path)
+        tmp_path = f"{root}.tmp{extension}"
+        if extension.lower() == ".csv":
+            df.to_csv(tmp_path, index=False)
+        else:
+            df.to_excel(tmp_path, index=False, engine='openpyxl')
+
+        # 교체 후 기록 삭제 (그 사이에 중단되어도 기록을 다시 적용하면 결과가 같다)
+        os.replace(tmp_path, doc_path)
+        if os.path.exists(changes_path(doc_path)):
+            os.remove(changes_path(doc_path))
+        lab_index.version, lab_index.log_offset = _catalog_version(doc_path), 0
+
+        lab_index.compact()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fold the upsert_lab / delete_lab change logs into the catalog and index files.")
+    parser.add_argument("--doc-path", default=None)
+    args = parser.parse_args()
+
+    compact_catalog(args.doc_path)
+    print(f"✅ 변경 기록 반영 완료 → {args.doc_path or default_catalog_path()}")
@@ -0,0 +1,186 @@
+import json
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from ivf_index import IVFRetriever
+from load_embeddings import embedding_id
+from change_log import append_change, read_changes
+
+# 연구실 간 유사도 그래프 저장 경로
+GRAPH_PATH = "./data/lab_graph.json"
+
+# 연구실마다 보관하는 이웃 수
+NUM_NEIGHBORS = 10
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(np.linalg.norm(vector), 1e-12)
+
+
+def get_lab_vectors(search_model, lab_indexes: List[int]) -> Dict[int, np.ndarray]:
+    """
+    load_retriever 가 이미 만든 임베딩 중 주어진 연구실의 벡터를 {연구실 index: 정규화된 벡터} 로 꺼낸다.
+    (임베딩 재계산 없음, IVF 는 해당 행만 읽는다)
+    """
+    dense_retriever = search_model.retrievers[0]
+    vectors = {}
+
+    if isinstance(dense_retriever, IVFRetriever):
+        for lab_index in lab_indexes:
+            vector = dense_retriever.get_vector(lab_index)
+            if vector is not None:
+                vectors[int(lab_index)] = vector
+    else:
+        data = dense_retriever.vectorstore.get(ids=[str(int(i)) for i in lab_indexes], include=["embeddings", "metadatas"])
+        for metadata, embedding in zip(data["metadatas"], data["embeddings"]):
+            vectors[int(metadata["index"])] = _normalize(embedding)
+
+    return vectors
+
+
+def iter_lab_vectors(search_model, chunk_size: int = 4096) -> Iterator[Tuple[int, np.ndarray]]:
+    """검색기의 모든 연구실 벡터 (IVF 는 샤드를 chunk 단위로 읽어 전체를 메모리에 올리지 않는다)"""
+    dense_retriever = search_model.retrievers[0]
+
+    if isinstance(dense_retriever, IVFRetriever):
+        overrides = dense_retriever.overrides
+        for index in dense_retriever.indexes:
+            for start in range(0, len(index), chunk_size):
+                chunk = np.asarray(index.vectors[start:start + chunk_size], dtype=np.float32)
+                for lab_index, vector in zip(index.ids[start:start + chunk_size], chunk):
+                    if int(lab_index) not in overrides:
+                        yield int(lab_index), _normalize(vector)
+        for lab_index, override in overrides.items():
+            if override is not None:
+                yield lab_index, override[0]
+    else:
+        data = dense_retriever.vectorstore.get(include=["embeddings", "metadatas"])
+        for metadata, embedding in zip(data["metadatas"], data["embeddings"]):
+            yield int(metadata["index"]), _normalize(embedding)
+
+
+def _vector_dim(search_model) -> int:
+    dense_retriever = search_model.retrievers[0]
+    if isinstance(dense_retriever, IVFRetriever):
+        return int(dense_retriever.indexes[0].centroids.shape[1]) if dense_retriever.indexes else 0
+    data = dense_retriever.vectorstore.get(limit=1, include=["embeddings"])
+    return len(data["embeddings"][0]) if len(data["embeddings"]) else 0
+
+
+def graph_embedding(search_model) -> dict:
+    """그래프를 만든 벡터의 출처 (임베딩 모델, 인덱스 백엔드, 차원), 달라지면 그래프를 다시 만들어야 한다."""
+    dense_retriever = search_model.retrievers[0]
+    return {
+        "model": embedding_id(),
+        "index_backend": "ivf" if isinstance(dense_retriever, IVFRetriever) else "chroma",
+        "dim": _vector_dim(search_model),
+    }
+
+
+def search_neighbors(search_model, lab_index: int, vector: np.ndarray, k: int = NUM_NEIGHBORS) -> List[List]:
+    """
+    벡터 검색기로 찾은 연구실의 최근접 이웃 [index, score] k 개 (자기 자신 제외)
+    IVF 는 ANN 검색, Chroma 는 벡터 검색 후 저장된 벡터로 코사인 점수를 계산한다.
+    """
+    dense_retriever = search_model.retrievers[0]
+    if isinstance(dense_retriever, IVFRetriever):
+        found = [(found_index, score) for score, found_index, _, _, _ in dense_retriever.search_vector(vector, k + 1)]
+    else:
+        docs = dense_retriever.vectorstore.similarity_search_by_vector(np.asarray(vector).tolist(), k=k + 1)
+        vectors = get_lab_vectors(search_model, [int(doc.metadata["index"]) for doc in docs])
+        found = [(found_index, float(found_vector @ vector)) for found_index, found_vector in vectors.items()]
+
+    found = sorted((entry for entry in found if entry[0] != int(lab_index)), key=lambda entry: -entry[1])[:k]
+    return [[int(found_index), round(float(score), 6)] for found_index, score in found]
+
+
+def build_similarity_graph(search_model, k: int = NUM_NEIGHBORS, embedding: dict = None) -> dict:
+    """
+    Build the k-nearest-neighbour graph of every lab (offline, see __main__).
+
+    Each lab's neighbours come from a vector search with its stored vector
+    (IVF: an ANN search per lab), so no all-pairs product or in-memory copy
+    of every vector is needed.
+    """
+    neighbors = {}
+    for count, (lab_index, vector) in enumerate(iter_lab_vectors(search_model), start=1):
+        neighbors[str(lab_index)] = search_neighbors(search_model, lab_index, vector, k)
+        if count % 10000 == 0:
+            print(f"🔄 {count}개 연구실 이웃 계산 완료")
+
+    return {"k": k, "embedding": embedding, "neighbors": neighbors}
+
+
+def graph_changes_path(path: str = None) -> str:
+    """연구실 단위 변경으로 바뀐 이웃 목록 기록 (예: lab_graph.json -> lab_graph.changes.jsonl)"""
+    return f"{os.path.splitext(path or GRAPH_PATH)[0]}.changes.jsonl"
+
+
+def load_similarity_graph(path: str = None, embedding: dict = None) -> dict:
+    """
+    저장된 그래프를 읽고 이웃 목록 변경 기록을 반영한다. (path 를 주지 않으면 호출 시점의 GRAPH_PATH)
+    없거나, embedding 과 다른 임베딩으로 만들어졌으면 빈 그래프
+    (점수를 현재 벡터와 비교할 수 없으므로 lab_graph.py 로 다시 만들어야 한다)
+    """
+    path = path or GRAPH_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        graph = json.load(f)
+
+    if embedding is not None and graph.get("embedding") != embedding:
+        print(f"⚠️ {path} 그래프가 다른 임베딩 ({graph.get('embedding')}) 으로 만들어져 사용하지 않습니다. "
+              f"lab_graph.py 로 다시 생성하세요.")
+        return {}
+
+    for change in read_changes(graph_changes_path(path)):
+        for key in change["deleted"]:
+            graph["neighbors"].pop(key, None)
+        graph["neighbors"].update(change["neighbors"])
+    return graph
+
+
+def append_graph_change(neighbors: Dict[int, List[List]], deleted: List[int] = (), path: str = None):
+    """바뀐 이웃 목록만 기록 파일에 이어 쓴다. (그래프 파일 전체를 다시 쓰지 않음)"""
+    append_change(graph_changes_path(path), {
+        "neighbors": {str(lab_index): entries for lab_index, entries in neighbors.items()},
+        "deleted": [str(lab_index) for lab_index in deleted],
+    })
+
+
+def save_similarity_graph(graph: dict, path: str = None):
+    """그래프 전체를 저장하고, 이미 반영된 이웃 목록 변경 기록은 지운다."""
+    path = path or GRAPH_PATH
+    # 읽는 쪽이 쓰다 만 파일을 보지 않도록 임시 파일에 쓴 뒤 교체
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(graph, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    if os.path.exists(graph_changes_path(path)):
+        os.remove(graph_changes_path(path))
+
+
+def similar_labs(graph: dict, lab_index: int, n: int = 5) -> List[List]:
+    """그래프에서 바로 찾은 유사 연구실 [index, score] 목록 (임베딩 / LLM 호출 없음)"""
+    return graph.get("neighbors", {}).get(str(int(lab_index)), [])[:n]
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Build the lab-to-lab similarity graph from the current catalog index.")
+    parser.add_argument("--doc-path", default=None)
+    parser.add_argument("--output", default=GRAPH_PATH)
+    parser.add_argument("--k", type=int, default=NUM_NEIGHBORS)
+    args = parser.parse_args()
+
+    load_dotenv()
+    from lab_catalog import load_lab_index  # lab_catalog 가 이 모듈을 (lab_index 를 통해) import 하므로 지연 import
+
+    search_model = load_lab_index(args.doc_path).search_model
+    result = build_similarity_graph(search_model, k=args.k, embedding=graph_embedding(search_model))
+    save_similarity_graph(result, args.output)
+    print(f"✅ {len(result['neighbors'])}개 연구실 유사도 그래프 저장 완료 → {args.output}")
@@ -0,0 +1,276 @@
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+from langchain_core.documents import Document
+from get_docs import get_doc
+from ivf_index import IVFRetriever, commit_index_overrides, stage_index_overrides
+from lab_graph import append_graph_change, get_lab_vectors, graph_embedding, load_similarity_graph, save_similarity_graph
+from lab_graph import search_neighbors
+
+
+class ReadWriteLock:
+    """
+    읽기는 여러 스레드가 동시에, 쓰기는 하나만 잡을 수 있는 잠금
+    쓰기가 기다리는 동안에는 새 읽기를 받지 않는다. (재진입 불가)
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+def upsert_row(df: pd.DataFrame, row: dict) -> pd.DataFrame:
+    """
+    index 가 같은 행의 열을 row 값으로 바꾸거나, 없으면 행을 추가한다.
+    기존 행은 df 를 직접 고치므로, 읽는 쪽과 공유하는 DataFrame 이면 사본을 넘긴다.
+    """
+    mask = df['index'].astype(int) == int(row["index"])
+    if not mask.any():
+        return pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+    for column, value in row.items():
+        df.loc[mask, column] = value
+    return df
+
+
+def delete_row(df: pd.DataFrame, lab_index: int) -> pd.DataFrame:
+    return df[df['index'].astype(int) != int(lab_index)].reset_index(drop=True)
+
+
+class LabIndex:
+    """
+    연구실 DataFrame, 검색기, 유사도 그래프를 묶어 연구실 하나씩 추가 / 수정 / 삭제할 수 있게 한다.
+
+    - 검색은 읽기 잠금, BM25 / IVF 변경은 쓰기 잠금 안에서 한다.
+    - DataFrame 은 고친 사본으로, 그래프는 바뀐 연구실의 이웃 목록만 새 list 로 교체하므로
+      읽는 쪽이 이미 가진 객체는 바뀌지 않는다.
+    - 임베딩 계산과 Chroma 반영은 검색 잠금 밖에서 한다. (변경끼리는 순서대로 처리)
+    - 카탈로그마다 하나만 만들어 공유한다. (후보 수가 다른 요청은 invoke 의 top_k 로 자른다)
+    """
+
+    def __init__(self, df: pd.DataFrame, search_model, version=None, k: int = None):
+        self.df = df
+        self.search_model = search_model
+        self.version = version   # 이 인덱스가 반영하고 있는 카탈로그 버전 (lab_catalog 가 관리)
+        self.log_offset = 0      # 반영한 변경 기록 위치 (lab_catalog 가 관리)
+        self.k = k               # 검색기가 반환하는 문서 수 (load_retriever 의 k)
+        self._search_lock = ReadWriteLock()
+        self._update_lock = threading.Lock()
+        self._graph = None
+        self._graph_reverse = {}  # {연구실 index: 이 연구실을 이웃 목록에 가진 연구실 index 집합}
+
+    def invoke(self, query: str, top_k: int = None, **kwargs):
+        """검색기와 같은 방식으로 검색 (find_topk 에서 사용), top_k 가 주어지면 앞쪽 top_k 개만"""
+        with self._search_lock.read():
+            docs = self.search_model.invoke(query, **kwargs)
+        return docs[:top_k] if top_k is not None else docs
+
+    def ensure_k(self, k: int):
+        """검색기가 최소 k 개를 반환하도록 늘린다. (더 작은 후보 수는 invoke 의 top_k 로 처리)"""
+        if self.k is not None and self.k >= k:
+            return
+        dense_retriever, bm25_retriever = self.search_model.retrievers
+        with self._search_lock.write():
+            if isinstance(dense_retriever, IVFRetriever):
+                dense_retriever.k = k
+            else:
+                dense_retriever.search_kwargs["k"] = k
+            bm25_retriever.k = k
+            self.k = k
+
+    def get_graph(self) -> dict:
+        """
+        연구실 간 유사도 그래프 (lab_graph.py 로 오프라인에서 만든 파일을 처음 호출할 때 읽기만 한다)
+        파일이 없거나 다른 임베딩으로 만들어졌으면 빈 그래프
+        """
+        if self._graph is None:
+            with self._update_lock:
+                self._load_graph()
+        return self._graph
+
+    def _load_graph(self):
+        # _update_lock 을 잡은 상태에서 호출
+        if self._graph is not None:
+            return
+        graph = load_similarity_graph(embedding=graph_embedding(self.search_model))
+        for key, entries in graph.get("neighbors", {}).items():
+            for entry in entries:
+                self._graph_reverse.setdefault(entry[0], set()).add(int(key))
+        self._graph = graph
+
+    def upsert(self, row, persist: bool = False) -> dict:
+        """
+        Add a lab, or update the lab with the same 'index', without rebuilding the index.
+
+        Only this lab's text is embedded; BM25 postings, the DataFrame and the
+        similarity graph are updated for this lab alone. If only columns outside
+        the search text changed (e.g. email), just the DataFrame is replaced.
+
+        :param row: Catalog columns (dict or pandas Series) including 'index'; missing columns keep their values.
+        :param persist: Also append the new vector to the IVF index directory and the changed neighbor
+            lists to the graph change log (the catalog change is logged by lab_catalog).
+        :return: The lab's search document ({'index', 'text'}).
+        """
+        row = dict(row)
+        lab_index = int(row["index"])
+        dense_retriever, bm25_retriever = self.search_model.retrievers
+
+        with self._update_lock:
+            # 1. DataFrame 먼저 교체 (검색 결과에 나온 연구실은 항상 정보를 찾을 수 있도록)
+            mask = self.df['index'].astype(int) == lab_index
+            old_doc = get_doc(self.df[mask].iloc[0]) if mask.any() else None
+            df = upsert_row(self.df.copy(), row)
+            self.df = df
+
+            # 검색 문서에 들어가지 않는 열 (이메일, 홈페이지 등) 만 바뀌었으면 여기서 끝
+            doc = get_doc(df[df['index'].astype(int) == lab_index].iloc[0])
+            if old_doc is not None and old_doc["text"] == doc["text"]:
+                return doc
+            document = Document(page_content=doc["text"], metadata={"index": lab_index})
+
+            # 2. 벡터: 이 연구실만 임베딩
+            if isinstance(dense_retriever, IVFRetriever):
+                vector = dense_retriever.embeddings.embed_documents([doc["text"]])[0]
+            else:
+                dense_retriever.vectorstore.add_documents([document], ids=[str(lab_index)])
+
+            # 3. 검색 중인 요청이 끝난 뒤 BM25 / IVF 반영
+            with self._search_lock.write():
+                if isinstance(dense_retriever, IVFRetriever):
+                    dense_retriever.upsert(lab_index, vector, doc["text"])
+                bm25_retriever.upsert(str(lab_index), document)
+            if persist and isinstance(dense_retriever, IVFRetriever):
+                dense_retriever.save_override(lab_index)
+
+            self._update_graph(lab_index, doc["text"], persist=persist)
+
+        return doc
+
+    def delete(self, lab_index: int, persist: bool = False) -> bool:
+        """
+        Remove a lab from the retriever, the DataFrame and the similarity graph.
+
+        :param persist: Also record the deletion in the IVF index directory and the graph change log.
+        :return: False if no lab has this index.
+        """
+        lab_index = int(lab_index)
+        dense_retriever, bm25_retriever = self.search_model.retrievers
+
+        with self._update_lock:
+            if not (self.df['index'].astype(int) == lab_index).any():
+                return False
+
+            # 1. 검색기에서 먼저 제거 (DataFrame 보다 먼저)
+            if not isinstance(dense_retriever, IVFRetriever):
+                dense_retriever.vectorstore.delete(ids=[str(lab_index)])
+            with self._search_lock.write():
+                if isinstance(dense_retriever, IVFRetriever):
+                    dense_retriever.delete(lab_index)
+                bm25_retriever.delete(str(lab_index))
+            if persist and isinstance(dense_retriever, IVFRetriever):
+                dense_retriever.save_override(lab_index)
+
+            # 2. DataFrame / 그래프
+            self.df = delete_row(self.df, lab_index)
+            self._update_graph(lab_index, None, persist=persist)
+
+        return True
+
+    def compact(self):
+        """
+        Fold the persisted single-lab edits into the index files (offline or scheduled work).
+
+        IVF overrides are merged into the shards they touch, which are rewritten
+        next to the originals while searches continue and swapped in under the
+        search write lock, so queries stop paying for them. The graph change log
+        is folded into lab_graph.json.
+        """
+        dense_retriever = self.search_model.retrievers[0]
+        with self._update_lock:
+            overrides = dense_retriever.overrides if isinstance(dense_retriever, IVFRetriever) else None
+            if overrides and dense_retriever.path is not None:
+                staged = stage_index_overrides(dense_retriever.path, dense_retriever.indexes, overrides)
+                with self._search_lock.write():
+                    dense_retriever.indexes = commit_index_overrides(
+                        dense_retriever.path, dense_retriever.indexes, overrides, staged,
+                    )
+                    dense_retriever.overrides = {}
+
+            self._load_graph()
+            if self._graph:
+                save_similarity_graph(self._graph)
+
+    def _set_neighbors(self, lab_index: int, entries: list = None):
+        """그래프에서 연구실 하나의 이웃 목록을 교체한다. (entries 가 None 이면 삭제)"""
+        neighbors = self._graph["neighbors"]
+        for entry in neighbors.get(str(lab_index), []):
+            self._graph_reverse.get(entry[0], set()).discard(lab_index)
+        if entries is None:
+            neighbors.pop(str(lab_index), None)
+            return
+        neighbors[str(lab_index)] = entries
+        for entry in entries:
+            self._graph_reverse.setdefault(entry[0], set()).add(lab_index)
+
+    def _update_graph(self, lab_index: int, text: str = None, persist: bool = False):
+        """
+        그래프에서 이 연구실의 이웃과, 이 연구실을 이웃으로 갖던 / 새로 가질 연구실의 이웃만 다시 검색해
+        그 목록만 교체하고 기록 파일에 이어 쓴다. (카탈로그 크기와 무관)
+        text 가 None 이면 삭제, 그래프가 없으면 다음 오프라인 생성 때 반영된다.
+        """
+        self._load_graph()
+        if not self._graph:
+            return
+
+        k = self._graph["k"]
+        stale = set(self._graph_reverse.get(lab_index, ()))
+        changed = {}
+        with self._search_lock.read():
+            if text is not None:
+                vector = get_lab_vectors(self.search_model, [lab_index])[lab_index]
+                changed[lab_index] = search_neighbors(self.search_model, lab_index, vector, k)
+                stale.update(entry[0] for entry in changed[lab_index])
+            stale.discard(lab_index)
+
+            for other, vector in get_lab_vectors(self.search_model, sorted(stale)).items():
+                changed[other] = search_neighbors(self.search_model, other, vector, k)
+
+        if text is None:
+            self._set_neighbors(lab_index, None)
+            self._graph_reverse.pop(lab_index, None)
+        for other, entries in changed.items():
+            self._set_neighbors(other, entries)
+
+        if persist:
+            append_graph_change(changed, deleted=[lab_index] if text is None else [])
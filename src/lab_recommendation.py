@@ -2,35 +2,55 @@ from lab_recommendation_prompt import lab_recommendation_prompt
 import openai
 from langchain_openai import AzureChatOpenAI
 from search_agent import search_web
-
-
-def lab_recommendation(k, user_input: str, topk_lab: list[dict], status_callback=None) -> list[dict]:
+from llm_scheduler import get_scheduler, estimate_tokens
+from deadline import DeadlineExceeded, call_timeout
+
+
+def recommend_lab(user_input: str, lab: dict, deadline=None) -> dict:
+    """
+    연구실 하나에 대해 2~3문장의 추천 이유를 생성한다. 관련도가 없으면 None 을 반환한다.
+    deadline 이 지나면 DeadlineExceeded 를 발생시킨다.
+    """
+    lab_info_prompt = lab_recommendation_prompt(user_input, lab["text"])
+
+    # LLM에게 lab_info_prompt를 전달하여 관련도 판단 + 짧은 추천 이유 생성 (재시도/속도 제한은 스케줄러가 담당)
+    # 호출 timeout 은 남은 시간으로 제한
+    response = get_scheduler().call(
+        lambda: AzureChatOpenAI(model='gpt-4o', max_retries=0, max_tokens=300,
+                                timeout=call_timeout(deadline)).invoke(lab_info_prompt),
+        estimated_tokens=estimate_tokens(lab_info_prompt, 300),
+        deadline=deadline,
+    )
+    response_text = response.content
+
+    if "관련도 없음" in response_text:
+        return None
+
+    return {
+        "index": lab["index"],
+        "lab_info": lab["text"],
+        "recommendation_reason": response_text
+    }
+
+
+def lab_recommendation(k, user_input: str, topk_lab: list[dict], status_callback=None, deadline=None) -> list[dict]:
     result_list = []
     
     for lab in topk_lab:
-        index = lab["index"]
-        lab_info_prompt = lab_recommendation_prompt(user_input, lab["text"])
-
-
-        # LLM에게 lab_info_prompt를 전달하여 추천 이유 생성
-        model = AzureChatOpenAI(model='gpt-4o')
-        response = model.invoke(lab_info_prompt)
-        response_text = response.content
-
-        result = {
-            "index": index,
-            "lab_info": lab["text"],
-            "recommendation_reason": response_text
-        }
-
-        if "관련도 없음" in response_text:
+        try:
+            result = recommend_lab(user_input, lab, deadline=deadline)
+        except DeadlineExceeded:
+            # 제한 시간이 지나면 남은 호출은 하지 않고 완료된 결과만 반환
+            print("⏱️ 요청 제한 시간이 지나 완료된 추천만 반환합니다.")
+            return result_list
+        if result is None:
             continue
 
         result_list.append(result)
 
     if len(result_list) == 0:
         print("\n\n\n\n추천할 연구실이 데이터 베이스 상에 없습니다.\n 웹에서 검색을 실시합니다.\n\n\n\n")
-        result = search_web(user_input, max_results=k, status_callback=status_callback)
+        result = search_web(user_input, max_results=k, status_callback=status_callback, deadline=deadline)
 
         return result
 
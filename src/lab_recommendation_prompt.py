@@ -14,18 +14,13 @@ def lab_recommendation_prompt(user_input: str, lab_info_text: str) -> str:
 
 
     ### 작성 지침 ###
-    1. 사용자 조건 요약  
-    - 사용자의 요청 내용(관심 분야, 희망 조건, 연구 경험 등)을 간결하고 명확하게 요약한다.  
-    - 경험 기반일 경우 ‘선호’와 ‘비선호’ 조건이 있다면 함께 정리한다.
-    2. 연구실 추천 설명  
-    다음 요소를 포함해 해당 연구실이 적합한 이유를 설명한다:  
-    - 연구실명 / 지도교수명  
-    - 연구 분야 요약 (핵심 키워드 중심)  
-    - 사용자 조건과의 관련성 (단순 키워드 일치가 아닌 의미상 연결성 중심)  
-    - 이 연구실만의 특징 또는 장점 (연구 방식, 데이터, 협업 구조, 기법, 진로 등)  
-    - 이메일 또는 홈페이지 주소 등 접근 정보를 포함한다.
-    3. 결과 없음 또는 관련도 낮은 경우  
-    추천된 연구실이 사용자의 조건과 부합하지 않는다면, 위 작성을 더이상 작업하지 않고, “관련도 없음”이라고만 출력한다.
+    1. 관련도 판단  
+    추천된 연구실이 사용자의 조건과 부합하지 않는다면, 더이상 작성하지 않고 “관련도 없음”이라고만 출력한다.
+    2. 추천 이유  
+    부합한다면 사용자 조건과 이 연구실의 연관성을 중심으로 2~3문장의 추천 이유만 작성한다.  
+    - 단순 키워드 일치가 아닌 의미상 연결성을 설명한다.  
+    - 경험 기반 요청에 ‘선호’와 ‘비선호’ 조건이 있다면 이를 반영한다.  
+    - 연구실명, 지도교수, 소속, 논문, 이메일 / 홈페이지 등 연구실 기본 정보는 반복하지 않는다. (연구실 카드에 이미 포함됨)
     """
 
     return prompt
\ No newline at end of file
@@ -0,0 +1,221 @@
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable
+
+import openai
+from deadline import DeadlineExceeded, check_deadline
+
+# 우선순위 (작을수록 먼저 실행)
+INTERACTIVE = 0  # Streamlit 등 사용자가 기다리는 요청
+BATCH = 1        # 오프라인 작업 (인덱스/카드 생성 등)
+
+_current_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """with 블록 안의 LLM 호출 우선순위를 지정한다. (예: 배치 작업은 BATCH)"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def estimate_tokens(prompt, max_output_tokens: int = 1024) -> int:
+    """요청 토큰 수 추정 (입력 글자 수 기반의 보수적 근사 + 최대 출력 토큰)"""
+    if not isinstance(prompt, str):
+        prompt = "".join(str(m.get("content", "")) if isinstance(m, dict) else str(m) for m in prompt)
+    return len(prompt) // 2 + max_output_tokens
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return isinstance(error, openai.RateLimitError) or getattr(error, "status_code", None) == 429
+
+
+def _is_transient(error: Exception) -> bool:
+    return isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError))
+
+
+def _retry_after(error: Exception) -> float:
+    """429 응답의 retry-after 헤더 (초), 없으면 None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """분당 허용량(rate_per_minute)만큼 채워지는 토큰 버킷"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """amount 만큼 사용할 수 있을 때까지 기다려야 하는 시간 (초)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    """
+    프로세스 전역 LLM 호출 스케줄러
+
+    - 분당 요청 수(RPM) / 토큰 수(TPM) 토큰 버킷
+    - AIMD 동시 실행 수 조절: 성공하면 천천히 늘리고, 429 를 받으면 절반으로 줄인다
+    - 429 / 일시적 오류는 jitter 가 있는 지수 backoff 로 재시도
+    - 우선순위 큐: 대기 중인 INTERACTIVE 요청이 BATCH 요청보다 항상 먼저 실행되고,
+      BATCH 요청은 동시 실행 한도의 batch_share 비율까지만 사용한다
+    """
+
+    def __init__(self, requests_per_minute: float = 300, tokens_per_minute: float = 150000,
+                 max_concurrency: int = 8, min_concurrency: int = 1, batch_share: float = 0.75,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.batch_share = batch_share
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.concurrency_limit = float(max_concurrency)
+        self._running = 0
+        self._paused_until = 0.0       # retry-after 동안 모든 요청 대기
+        self._last_decrease = 0.0
+        self._queue = []               # (priority, seq, ticket)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _slots(self, priority: int) -> int:
+        limit = max(self.min_concurrency, int(self.concurrency_limit))
+        if priority > INTERACTIVE:
+            limit = max(1, int(limit * self.batch_share))
+        return limit
+
+    def _acquire(self, priority: int, tokens: int, deadline=None):
+        ticket = object()
+        with self._cond:
+            heapq.heappush(self._queue, (priority, next(self._seq), ticket))
+            try:
+                while True:
+                    # 대기 중에 요청이 취소되거나 제한 시간이 지나면 줄에서 빠진다
+                    check_deadline(deadline)
+                    now = time.monotonic()
+                    wait = None
+                    if self._queue[0][2] is ticket and self._running < self._slots(priority):
+                        wait = max(
+                            self._paused_until - now,
+                            self.request_bucket.wait_time(1, now),
+                            self.token_bucket.wait_time(tokens, now),
+                        )
+                        if wait <= 0:
+                            break
+                    if deadline is not None:
+                        wait = min(wait, 0.5) if wait is not None else 0.5
+                    self._cond.wait(timeout=wait)
+
+                heapq.heappop(self._queue)
+                self.request_bucket.take(1)
+                self.token_bucket.take(tokens)
+                self._running += 1
+            except BaseException:
+                self._queue = [entry for entry in self._queue if entry[2] is not ticket]
+                heapq.heapify(self._queue)
+                raise
+            finally:
+                # 다음 대기 요청이 자신의 차례인지 다시 확인하도록 깨운다
+                self._cond.notify_all()
+
+    def _release(self, succeeded: bool = False, rate_limited: bool = False, retry_after: float = None):
+        with self._cond:
+            self._running -= 1
+            now = time.monotonic()
+            if rate_limited:
+                # 같은 429 폭주에 여러 번 줄이지 않도록 1초에 한 번만 감소
+                if now - self._last_decrease > 1.0:
+                    self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+                    self._last_decrease = now
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+            elif succeeded:
+                self.concurrency_limit = min(
+                    self.max_concurrency, self.concurrency_limit + 1.0 / self.concurrency_limit
+                )
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 1024, priority: int = None, deadline=None) -> Any:
+        """
+        Run fn under the scheduler's rate limits, retrying rate-limit and transient errors.
+
+        :param estimated_tokens: Tokens charged against the per-minute token budget.
+        :param priority: INTERACTIVE or BATCH; defaults to the llm_priority() context.
+        :param deadline: Optional Deadline; raises DeadlineExceeded instead of waiting or retrying past it.
+        """
+        if priority is None:
+            priority = _current_priority.get()
+
+        for attempt in range(self.max_retries + 1):
+            self._acquire(priority, estimated_tokens, deadline)
+            try:
+                result = fn()
+            except Exception as e:
+                rate_limited = _is_rate_limit(e)
+                retry_after = _retry_after(e) if rate_limited else None
+                self._release(rate_limited=rate_limited, retry_after=retry_after)
+                if not (rate_limited or _is_transient(e)) or attempt == self.max_retries:
+                    raise
+                delay = retry_after or self._backoff(attempt)
+                remaining = deadline.remaining() if deadline is not None else None
+                if remaining is not None and delay >= remaining:
+                    raise DeadlineExceeded("request deadline exceeded while retrying") from e
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self._release()
+                raise
+
+            self._release(succeeded=True)
+            return result
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """환경변수(LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY)로 설정된 전역 스케줄러"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                requests_per_minute=float(os.getenv("LLM_RPM", "300")),
+                tokens_per_minute=float(os.getenv("LLM_TPM", "150000")),
+                max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            )
+        return _scheduler
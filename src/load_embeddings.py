@@ -0,0 +1,135 @@
+import os
+from functools import lru_cache
+from typing import Callable, Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    로컬 ONNX 인코더 기반 임베딩 (네트워크 호출 없음)
+
+    model_path 디렉터리에는 model.onnx 와 tokenizer.json 이 있어야 한다.
+    """
+
+    def __init__(self, model_path: str, batch_size: int = 32, intra_op_threads: int = 0, max_length: int = 512):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.batch_size = batch_size
+
+        # 토크나이저 로드 (배치 내 최대 길이로 padding)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        # intra-op 스레드 수 설정 (0이면 onnxruntime 기본값 = 물리 코어 수)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_path, "model.onnx"),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        output = self.session.run(None, feeds)[0]
+
+        # (batch, seq, hidden) 출력이면 attention mask 기준 mean pooling
+        if output.ndim == 3:
+            mask = attention_mask[..., None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        # 코사인 유사도 검색을 위해 L2 정규화
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return output / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        # 길이순으로 정렬해 배치별 padding 낭비를 줄이고, 원래 순서로 복원
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            batch_vectors = self._encode_batch([texts[i] for i in batch_ids])
+            for i, vector in zip(batch_ids, batch_vectors):
+                vectors[i] = vector.tolist()
+
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode_batch([text])[0].tolist()
+
+
+# azure 백엔드가 사용하는 임베딩 모델
+AZURE_EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def _load_azure_embeddings() -> Embeddings:
+    from langchain_openai import AzureOpenAIEmbeddings
+
+    return AzureOpenAIEmbeddings(model=AZURE_EMBEDDING_MODEL)
+
+
+def _load_onnx_embeddings() -> Embeddings:
+    model_path = os.getenv("EMBEDDING_MODEL_PATH")
+    if not model_path:
+        raise ValueError("EMBEDDING_MODEL_PATH must be set to use the onnx embedding backend.")
+
+    return OnnxEmbeddings(
+        model_path,
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+        intra_op_threads=int(os.getenv("EMBEDDING_THREADS", "0")),
+    )
+
+
+# 백엔드 이름 -> 임베딩 생성 함수
+EMBEDDING_BACKENDS: Dict[str, Callable[[], Embeddings]] = {
+    "azure": _load_azure_embeddings,
+    "onnx": _load_onnx_embeddings,
+}
+
+
+def register_embedding_backend(name: str, factory: Callable[[], Embeddings]):
+    """새 임베딩 백엔드를 등록한다."""
+    EMBEDDING_BACKENDS[name] = factory
+    load_embeddings.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def load_embeddings(backend: str = None) -> Embeddings:
+    """
+    Load the embedding model for the given backend (default: EMBEDDING_BACKEND env, "azure").
+
+    The model is created once per process, so ONNX sessions are not reloaded on every request.
+    """
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "azure")
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend} (available: {', '.join(EMBEDDING_BACKENDS)})")
+
+    return EMBEDDING_BACKENDS[backend]()
+
+
+def embedding_id(backend: str = None) -> str:
+    """
+    임베딩 백엔드 / 모델 식별자 (저장된 벡터 기반 결과를 재사용해도 되는지 확인하는 데 사용)
+    """
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "azure")
+    if backend == "azure":
+        return f"azure:{AZURE_EMBEDDING_MODEL}"
+    if backend == "onnx":
+        return f"onnx:{os.path.abspath(os.getenv('EMBEDDING_MODEL_PATH', ''))}"
+    return backend
@@ -1,34 +1,103 @@
+import os
+
 from langchain_core.documents import Document
 from langchain.retrievers import EnsembleRetriever
 from langchain_community.vectorstores import Chroma
-from langchain_community.retrievers import BM25Retriever
-from langchain_openai import AzureOpenAIEmbeddings
+from load_embeddings import embedding_id, load_embeddings
+from ivf_index import IVFIndex, IVFRetriever, docs_fingerprint, index_exists, load_index_meta, load_index_shards
+from ivf_index import clear_index_overrides, load_index_overrides, overridden_fingerprint
+from bm25_index import IncrementalBM25Retriever
+
+
+def load_ivf_retriever(docs: list[dict], embeddings, k: int = 3, index_dir: str = None):
+    """
+    IVF + int8 ANN 인덱스 기반 검색기를 생성한다.
+    index_dir 에 저장된 인덱스(또는 ingest_catalog 가 만든 샤드)와 연구실 단위 변경 기록이 docs 및 현재 임베딩 모델과
+    일치하면 불러오고, 없거나 docs / 임베딩 모델 / 차원이 바뀌었으면 docs 로 다시 생성한 뒤 저장한다.
+    ingest_catalog 가 만든 샤드는 여기서 다시 만들지 않고, 일치하지 않으면 오류를 낸다.
+    """
+    fingerprint = docs_fingerprint([doc["index"] for doc in docs], [doc["text"] for doc in docs])
+    embedding_model = embedding_id()
+    indexes, overrides = None, {}
+
+    if index_exists(index_dir):
+        indexes = load_index_shards(index_dir)
+        overrides = load_index_overrides(index_dir)
+        meta = load_index_meta(index_dir)
+
+        # 다른 모델 (또는 차원) 의 벡터는 질의 벡터와 비교할 수 없다
+        if meta.get("embedding_model") != embedding_model or meta.get("dim") != len(embeddings.embed_query("dim")):
+            mismatch = f"a different embedding model ({meta.get('embedding_model')}, dim {meta.get('dim')})"
+        elif meta.get("fingerprint") is None \
+                or overridden_fingerprint(meta["fingerprint"], indexes, overrides) != fingerprint:
+            mismatch = "a different catalog"
+        else:
+            mismatch = None
+
+        if mismatch:
+            if os.path.exists(os.path.join(index_dir, "manifest.json")):
+                raise ValueError(
+                    f"IVF index at {index_dir} was built from {mismatch}; "
+                    f"re-run ingest_catalog for the current data and embedding model ({embedding_model})"
+                )
+            print(f"🔄 {index_dir} 인덱스가 {mismatch} 로 만들어져 다시 생성합니다.")
+            indexes, overrides = None, {}
 
-def load_retriever(docs: list[dict], k: int = 3):
+    if indexes is None:
+        vectors = embeddings.embed_documents([doc["text"] for doc in docs])
+        index = IVFIndex.build(vectors, [doc["index"] for doc in docs], [doc["text"] for doc in docs])
+        if index_dir:
+            index.save(index_dir, embedding_model=embedding_model)
+            clear_index_overrides(index_dir)
+        indexes = [index]
+
+    return IVFRetriever(
+        indexes=indexes,
+        embeddings=embeddings,
+        k=k,
+        nprobe=int(os.getenv("IVF_NPROBE", "8")),
+        rerank_factor=int(os.getenv("IVF_RERANK_FACTOR", "4")),
+        overrides=overrides,
+        path=index_dir,
+    )
+
+
+def load_retriever(docs: list[dict], k: int = 3, embeddings=None, index_backend: str = None, index_dir: str = None):
     # Step 1: dict -> LangChain Document 변환
     langchain_docs = [
         Document(page_content=doc["text"], metadata={"index": doc["index"]})
         for doc in docs
     ]
+    # 연구실 index 를 문서 id 로 사용 (연구실 단위 upsert / delete 에 사용)
+    ids = [str(doc["index"]) for doc in docs]
 
-    # Step 2: 임베딩 모델 로드
-    embeddings = AzureOpenAIEmbeddings(model="text-embedding-3-small")
-
-    # Step 3: 벡터 저장소 생성 (in-memory, not persisted)
-    chroma_db = Chroma.from_documents(
-        documents=langchain_docs,
-        embedding=embeddings,
-        collection_name="db_lab_info",
-    )
+    # Step 2: 임베딩 모델 로드 (지정하지 않으면 EMBEDDING_BACKEND 환경변수 기준)
+    if embeddings is None:
+        embeddings = load_embeddings()
 
-    chroma_k_retriever = chroma_db.as_retriever(search_kwargs={"k": k})
+    # Step 3: 벡터 검색기 생성 (chroma: in-memory, ivf: 디스크에 저장되는 ANN 인덱스)
+    index_backend = index_backend or os.getenv("INDEX_BACKEND", "chroma")
+    if index_backend == "ivf":
+        dense_retriever = load_ivf_retriever(docs, embeddings, k=k, index_dir=index_dir or os.getenv("IVF_INDEX_DIR"))
+    else:
+        chroma_db = Chroma.from_documents(
+            documents=langchain_docs,
+            embedding=embeddings,
+            collection_name="db_lab_info",
+            ids=ids,
+        )
+        # 같은 프로세스에서 다시 로드한 경우, 이전 카탈로그에만 있던 연구실 제거
+        stale_ids = set(chroma_db.get(include=[])["ids"]) - set(ids)
+        if stale_ids:
+            chroma_db.delete(ids=list(stale_ids))
+        dense_retriever = chroma_db.as_retriever(search_kwargs={"k": k})
 
     # Step 4: BM25 검색기 생성
-    bm25_retriever = BM25Retriever.from_documents(langchain_docs)
+    bm25_retriever = IncrementalBM25Retriever.from_documents(langchain_docs, ids)
     bm25_retriever.k = k  # 반환할 문서 수 설정
 
     # Step 5: 앙상블 검색기 생성
-    emsemble_retrievers = [chroma_k_retriever, bm25_retriever]
+    emsemble_retrievers = [dense_retriever, bm25_retriever]
     emsemble_retriever = EnsembleRetriever(
         retrievers=emsemble_retrievers,
         weights=[1, 0]
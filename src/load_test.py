@@ -0,0 +1,414 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import queue
+import random
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+# 질의 파일을 지정하지 않았을 때 사용하는 기본 질의
+DEFAULT_QUERIES = [
+    "인공지능과 머신러닝을 활용한 의료 연구에 관심있습니다.",
+    "딥러닝 기반 컴퓨터 비전 연구실을 찾고 있습니다.",
+    "로봇 제어와 강화학습을 연구하고 싶습니다.",
+    "신약 개발을 위한 단백질 구조 예측에 관심이 있습니다.",
+    "자연어 처리와 대규모 언어 모델을 연구하는 연구실",
+    "배터리 소재와 에너지 저장 장치 연구",
+    "반도체 공정과 소자 설계를 연구하고 싶어요.",
+    "뇌과학과 신경망 모델링을 함께 하는 연구실",
+]
+
+
+# ---------------------------------------------------------------------------
+# 외부 백엔드 대체용 stub (지연 시간만 흉내냄)
+# ---------------------------------------------------------------------------
+
+def _sleep(latency: float, jitter: float, timeout: float = None, timeout_error: Callable[[], Exception] = None):
+    """지연 시간만큼 대기, timeout 보다 길면 timeout 만큼 기다린 뒤 실제 클라이언트처럼 timeout 예외를 발생시킨다."""
+    delay = max(0.0, random.gauss(latency, latency * jitter))
+    if timeout is not None and delay > timeout:
+        time.sleep(timeout)
+        raise (timeout_error or TimeoutError)()
+    time.sleep(delay)
+
+
+def _api_timeout_error() -> Exception:
+    # openai 클라이언트가 요청 timeout 때 발생시키는 예외 (llm_scheduler 가 일시적 오류로 처리)
+    import httpx
+    import openai
+
+    return openai.APITimeoutError(request=httpx.Request("POST", "https://stub.invalid/chat/completions"))
+
+
+class StubEmbeddings(Embeddings):
+    """질의 해시로 만든 고정 벡터를 반환하는 임베딩 stub"""
+
+    def __init__(self, latency: float, jitter: float, dim: int = 256):
+        self.latency, self.jitter, self.dim = latency, jitter, dim
+
+    def _vector(self, text: str) -> List[float]:
+        import numpy as np
+
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        vector = np.random.default_rng(seed).normal(size=self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        _sleep(self.latency, self.jitter)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        _sleep(self.latency, self.jitter)
+        return self._vector(text)
+
+
+def _stub_chat_model(latency: float, jitter: float, irrelevant_rate: float):
+    class StubChatModel:
+        """AzureChatOpenAI 대체: invoke 시 지연 후 고정 응답"""
+
+        def __init__(self, **kwargs):
+            self.timeout = kwargs.get("timeout")
+
+        def invoke(self, prompt):
+            _sleep(latency, jitter, self.timeout, _api_timeout_error)
+            if random.random() < irrelevant_rate:
+                return SimpleNamespace(content="관련도 없음")
+            return SimpleNamespace(content=f"[stub] 추천 결과 ({len(str(prompt))}자 입력)")
+
+    return StubChatModel
+
+
+class _StubCompletions:
+    def __init__(self, latency: float, jitter: float, timeout: float = None):
+        self.latency, self.jitter, self.timeout = latency, jitter, timeout
+
+    def create(self, messages, **kwargs):
+        _sleep(self.latency, self.jitter, self.timeout, _api_timeout_error)
+        content = "\n".join(f"===추천{i}===\n[stub] 웹 검색 추천 {i}" for i in range(1, 11))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class StubOpenAIClient:
+    """search_agent 의 openai_client 대체"""
+
+    def __init__(self, latency: float, jitter: float, timeout: float = None):
+        self.latency, self.jitter = latency, jitter
+        self.chat = SimpleNamespace(completions=_StubCompletions(latency, jitter, timeout))
+
+    def with_options(self, timeout: float = None, **kwargs):
+        return StubOpenAIClient(self.latency, self.jitter, timeout)
+
+
+class StubTavilyClient:
+    """search_agent 의 tavily_client 대체"""
+
+    def __init__(self, latency: float, jitter: float):
+        self.latency, self.jitter = latency, jitter
+
+    def search(self, query: str, max_results: int = 5, timeout: float = None, **kwargs):
+        _sleep(self.latency, self.jitter, timeout)
+        return {"results": [
+            {"title": f"[stub] {query} {i}", "url": f"https://example.com/{i}", "content": "stub", "published_date": ""}
+            for i in range(max_results)
+        ]}
+
+
+def install_stub_backends(llm_latency: float = 2.0, search_latency: float = 1.0, embed_latency: float = 0.05,
+                          jitter: float = 0.3, irrelevant_rate: float = 0.2):
+    """
+    Replace Azure OpenAI, Tavily and the embedding model with local latency-simulating stubs.
+
+    Only this process is affected; the rest of the pipeline (retrieval, scheduler,
+    coalescing, deadlines) runs unchanged. The IVF index and the similarity graph
+    are pointed at a new temporary directory, so stub vectors never overwrite the
+    real ones (Chroma is in-memory and keeps nothing on disk).
+
+    :return: The temporary directory; the caller removes it after the run.
+    """
+    import lab_cards
+    import lab_catalog
+    import lab_graph
+    import get_result_list
+    import lab_recommendation
+    import search_agent
+    from load_embeddings import register_embedding_backend
+
+    # 카탈로그는 실제 경로를 그대로 읽고 (IVF_INDEX_DIR 을 바꾸기 전에 결정), 인덱스 / 그래프만 임시 디렉터리에
+    lab_catalog.DOC_PATH = lab_catalog.default_catalog_path()
+    work_dir = tempfile.mkdtemp(prefix="lab_load_test_")
+    os.environ["IVF_INDEX_DIR"] = os.path.join(work_dir, "index")
+    lab_graph.GRAPH_PATH = os.path.join(work_dir, "lab_graph.json")
+
+    register_embedding_backend("stub", lambda: StubEmbeddings(embed_latency, jitter))
+    os.environ["EMBEDDING_BACKEND"] = "stub"
+
+    chat_model = _stub_chat_model(llm_latency, jitter, irrelevant_rate)
+    lab_recommendation.AzureChatOpenAI = chat_model
+    get_result_list.AzureChatOpenAI = chat_model
+    lab_cards.AzureChatOpenAI = chat_model
+
+    search_agent.openai_client = StubOpenAIClient(llm_latency, jitter)
+    search_agent.tavily_client = StubTavilyClient(search_latency, jitter)
+    return work_dir
+
+
+# ---------------------------------------------------------------------------
+# 부하 생성
+# ---------------------------------------------------------------------------
+
+def pipeline_sender(k: int, timeout: float) -> Callable[[str], bool]:
+    """
+    추천 세션을 직접 만들어 k개를 채운다. (create_session / extend_session)
+    제한 시간 때문에 일부 추천만 완성되었으면 False 를 반환한다.
+    """
+    from deadline import Deadline
+    from recommendation_session import get_session
+
+    def send(query: str) -> bool:
+        session = get_session(query, k, deadline=Deadline(timeout) if timeout else None)
+        return not session["timed_out"]
+
+    return send
+
+
+def http_sender(url: str, k: int, timeout: float) -> Callable[[str], None]:
+    """HTTP 프론트엔드에 GET {url}?query=...&k=... 요청 (완성 여부는 알 수 없으므로 None)"""
+    def send(query: str):
+        params = urllib.parse.urlencode({"query": query, "k": k})
+        with urllib.request.urlopen(f"{url}?{params}", timeout=timeout or None) as response:
+            response.read()
+
+    return send
+
+
+class _RssMonitor(threading.Thread):
+    """프로세스 RSS 최대값을 주기적으로 기록"""
+
+    def __init__(self, interval: float = 0.5):
+        super().__init__(daemon=True)
+        import psutil
+
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak = self.process.memory_info().rss
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def stop(self) -> Dict:
+        self.stopped.set()
+        current = self.process.memory_info().rss
+        return {"pid": self.process.pid, "rss_mb": current / 2 ** 20, "peak_rss_mb": max(self.peak, current) / 2 ** 20}
+
+
+def run_load(send: Callable[[str], bool], queries: List[str], num_requests: int, concurrency: int,
+             rate: float = 0.0, seed: int = 0) -> List[Dict]:
+    """
+    Send num_requests queries with `concurrency` workers.
+
+    With rate > 0 requests arrive as a Poisson process (open loop) and queueing time
+    is measured from the scheduled arrival; with rate == 0 workers send back to back.
+    A request whose send returns False finished only partially (deadline hit).
+    """
+    rng = random.Random(seed)
+    pending = queue.Queue()
+    samples = []
+    samples_lock = threading.Lock()
+
+    def produce():
+        next_arrival = time.monotonic()
+        for i in range(num_requests):
+            if rate > 0:
+                next_arrival += rng.expovariate(rate)
+                time.sleep(max(0.0, next_arrival - time.monotonic()))
+            pending.put((next_arrival if rate > 0 else None, rng.choice(queries)))
+        for _ in range(concurrency):
+            pending.put(None)
+
+    def work():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            scheduled, query = item
+            started = time.monotonic()
+            error, complete = None, None
+            try:
+                complete = send(query)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            finished = time.monotonic()
+
+            with samples_lock:
+                samples.append({
+                    "queue_time": started - scheduled if scheduled is not None else 0.0,
+                    "latency": finished - started,
+                    "error": error,
+                    "partial": complete is False,
+                })
+
+    threads = [threading.Thread(target=produce)] + [threading.Thread(target=work) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return samples
+
+
+def _run_process(options: Dict, process_index: int) -> Dict:
+    """(워커 프로세스) 부하 생성 후 샘플과 RSS 를 반환"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    work_dir = None
+    if options["mode"] == "pipeline" and not options["real_backends"]:
+        work_dir = install_stub_backends(
+            llm_latency=options["llm_latency"], search_latency=options["search_latency"],
+            embed_latency=options["embed_latency"], jitter=options["jitter"],
+            irrelevant_rate=options["irrelevant_rate"],
+        )
+    try:
+        return _measure(options, process_index)
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _measure(options: Dict, process_index: int) -> Dict:
+    if options["mode"] == "http":
+        send = http_sender(options["url"], options["k"], options["timeout"])
+    else:
+        send = pipeline_sender(options["k"], options["timeout"])
+        # 카탈로그 로드(엑셀 + 임베딩)는 측정에서 제외
+        from lab_catalog import load_catalog
+        load_catalog()
+
+    monitor = _RssMonitor()
+    monitor.start()
+    started = time.time()
+    samples = run_load(
+        send, options["queries"], options["requests"], options["concurrency"],
+        rate=options["rate"], seed=options["seed"] + process_index,
+    )
+    return {"samples": samples, "started": started, "finished": time.time(), "process": monitor.stop()}
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(0, math.ceil(percent / 100 * len(values)) - 1)
+    return values[rank]
+
+
+def summarize(results: List[Dict]) -> Dict:
+    # 카탈로그 로드 시간을 제외한, 첫 요청부터 마지막 응답까지의 시간
+    elapsed = max(result["finished"] for result in results) - min(result["started"] for result in results)
+    samples = [sample for result in results for sample in result["samples"]]
+    # 제한 시간 때문에 일부만 완성된 요청은 성공과 따로 집계 (지연 시간 / 처리량은 완성된 요청 기준)
+    ok = [sample for sample in samples if sample["error"] is None and not sample["partial"]]
+    partial = [sample for sample in samples if sample["error"] is None and sample["partial"]]
+    errors = {}
+    for sample in samples:
+        if sample["error"] is not None:
+            errors[sample["error"]] = errors.get(sample["error"], 0) + 1
+
+    def stats(key):
+        values = [sample[key] for sample in ok]
+        return {f"p{p}": round(_percentile(values, p), 3) for p in (50, 95, 99)}
+
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "partial": len(partial),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_seconds": stats("latency"),
+        "queue_time_seconds": stats("queue_time"),
+        "processes": [result["process"] for result in results],
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n📊 요청 {report['requests']}개 (성공 {report['succeeded']}개, 시간 초과로 일부만 완성 {report['partial']}개), "
+          f"{report['elapsed_seconds']}초")
+    print(f"  처리량 (성공 기준): {report['throughput_rps']} req/s")
+    latency, queue_time = report["latency_seconds"], report["queue_time_seconds"]
+    print(f"  지연 시간 p50/p95/p99: {latency['p50']} / {latency['p95']} / {latency['p99']} s")
+    print(f"  대기 시간 p50/p95/p99: {queue_time['p50']} / {queue_time['p95']} / {queue_time['p99']} s")
+    for process in report["processes"]:
+        print(f"  PID {process['pid']}: RSS {process['rss_mb']:.1f} MB (최대 {process['peak_rss_mb']:.1f} MB)")
+    for error, count in report["errors"].items():
+        print(f"  ❌ {count}회: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a query corpus against the lab recommendation pipeline.")
+    parser.add_argument("--mode", choices=["pipeline", "http"], default="pipeline")
+    parser.add_argument("--url", help="HTTP front-end endpoint (http mode)")
+    parser.add_argument("--queries", help="Query corpus file, one query per line")
+    parser.add_argument("--requests", type=int, default=100, help="Total number of requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="Total concurrent workers")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes (load is split evenly)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Total arrival rate in req/s (0 = closed loop)")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request deadline in seconds")
+    parser.add_argument("--real-backends", action="store_true", help="Call the real Azure OpenAI / Tavily backends")
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    parser.add_argument("--search-latency", type=float, default=1.0)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.3, help="Latency standard deviation as a fraction")
+    parser.add_argument("--irrelevant-rate", type=float, default=0.2, help="Share of stub LLM answers that are '관련도 없음'")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.mode == "http" and not args.url:
+        parser.error("--url is required in http mode")
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = DEFAULT_QUERIES
+
+    processes = max(1, args.processes)
+    options = dict(vars(args), queries=queries)
+    per_process = [
+        dict(options,
+             requests=args.requests // processes + (1 if i < args.requests % processes else 0),
+             concurrency=max(1, args.concurrency // processes),
+             rate=args.rate / processes)
+        for i in range(processes)
+    ]
+
+    if processes == 1:
+        results = [_run_process(per_process[0], 0)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_run_process, per_process, range(processes)))
+    report = summarize(results)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
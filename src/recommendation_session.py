@@ -0,0 +1,184 @@
+import copy
+
+from find_topk import find_topk
+from lab_catalog import load_catalog, load_lab_graph, CANDIDATE_POOL_SIZE
+from lab_graph import similar_labs
+from lab_recommendation import recommend_lab
+from get_result_list import final_prompts_output
+from search_agent import search_web
+from single_flight import SingleFlight, normalize_query
+from deadline import DeadlineExceeded
+
+# 동일한 (질의, k) 요청을 하나의 계산으로 합친다
+_in_flight = SingleFlight()
+
+
+def create_session(user_query: str, pool_size: int = CANDIDATE_POOL_SIZE, deadline=None) -> dict:
+    """
+    질의에 대한 후보 연구실을 한 번만 검색해 세션으로 보관한다.
+    이후 extend_session 은 아직 처리하지 않은 후보만 LLM 으로 처리한다.
+    """
+    _, search_model = load_catalog(pool_size=pool_size)
+    candidates = find_topk(search_model, user_query, top_k=pool_size, deadline=deadline)
+
+    return {
+        "user_query": user_query,
+        "pool_size": pool_size,
+        "candidates": candidates,
+        "next_candidate": 0,   # 다음에 처리할 후보 위치
+        "cards": [],           # 완성된 추천 카드 [{"index", "text"}]
+        "is_web_search": False,
+        "web_results": None,   # 웹 검색 결과 (처음 웹 검색할 때 pool_size 개를 한 번에 받아 둔다)
+        "next_web_result": 0,  # 다음에 보여줄 웹 검색 결과 위치
+        "timed_out": False,    # 마지막 처리가 제한 시간 때문에 중단되었는지 여부
+    }
+
+
+def _candidates_exhausted(session: dict) -> bool:
+    return session["next_candidate"] >= len(session["candidates"])
+
+
+def is_exhausted(session: dict) -> bool:
+    """더 보여줄 결과가 없는지 여부 (웹 검색 세션은 받아 둔 웹 검색 결과 기준)"""
+    if session["is_web_search"]:
+        return session["next_web_result"] >= len(session["web_results"])
+    return _candidates_exhausted(session)
+
+
+def _unique_texts(web_results: list) -> list:
+    """웹 검색 결과 중 내용이 같은 항목 제거 (search_web 은 부족한 개수를 마지막 항목으로 채운다)"""
+    texts = [item.get('recommendation_reason', '추천 결과를 찾을 수 없습니다.') for item in web_results]
+    return list(dict.fromkeys(texts))
+
+
+def extend_session(session: dict, k: int, status_callback=None, deadline=None) -> dict:
+    """
+    추천 카드가 k개가 될 때까지 남은 후보만 처리한다.
+    이미 k개 이상이면 아무 호출도 하지 않는다.
+
+    deadline 이 지나거나 취소되면 남은 호출은 하지 않고, 그때까지 완성된 카드만 남긴다.
+    처리 중이던 후보는 다음 extend_session 에서 다시 처리한다.
+    """
+    lab_total_info_df, _ = load_catalog(pool_size=session["pool_size"])
+    cards = session["cards"]
+    session["timed_out"] = False
+
+    # 카드가 하나도 없으면 앞쪽 k개 후보까지만 관련도를 확인하고 웹 검색으로 넘어간다
+    while not session["is_web_search"] and len(cards) < k and not _candidates_exhausted(session) \
+            and (cards or session["next_candidate"] < k):
+        lab = session["candidates"][session["next_candidate"]]
+        session["next_candidate"] += 1
+
+        if status_callback:
+            status_callback(f"🔬 후보 연구실 {session['next_candidate']}/{len(session['candidates'])} 검토 중...")
+
+        # 추천 이유 생성 (관련도 없으면 건너뜀)
+        try:
+            recommendation = recommend_lab(session["user_query"], lab, deadline=deadline)
+        except DeadlineExceeded:
+            session["next_candidate"] -= 1
+            session["timed_out"] = True
+            break
+        if recommendation is None:
+            continue
+
+        try:
+            texts = final_prompts_output([recommendation], lab_total_info_df, start=len(cards) + 1, deadline=deadline)
+        except Exception as e:
+            # 오류 발생 시 기본 메시지 반환
+            texts = [f"추천 결과 생성 중 오류가 발생했습니다: {str(e)}"]
+
+        if not texts and deadline is not None and deadline.expired:
+            session["next_candidate"] -= 1
+            session["timed_out"] = True
+            break
+
+        for text in texts:
+            cards.append({"index": recommendation["index"], "text": text})
+
+    # 앞쪽 k개 후보 (또는 전체 후보) 중 추천할 연구실이 없으면 웹 검색
+    # 웹 검색은 세션마다 한 번만 하고 (pool_size 개), "더 보기" / k 변경은 받아 둔 결과 중 아직 보여주지 않은 것만 추가
+    needs_web_search = not cards and (_candidates_exhausted(session) or session["next_candidate"] >= k)
+    if not session["is_web_search"] and needs_web_search and len(cards) < k \
+            and not (deadline is not None and deadline.expired):
+        web_results = search_web(session["user_query"], max_results=max(k, session["pool_size"]),
+                                 status_callback=status_callback, deadline=deadline)
+        if isinstance(web_results, list) and web_results:
+            session["web_results"] = _unique_texts(web_results)
+            session["is_web_search"] = True
+
+    while session["is_web_search"] and len(cards) < k and not is_exhausted(session):
+        cards.append({"index": -1, "text": session["web_results"][session["next_web_result"]]})
+        session["next_web_result"] += 1
+
+    if deadline is not None and deadline.expired and len(session["cards"]) < k:
+        session["timed_out"] = True
+
+    return session
+
+
+def _notify_waiting(status_callback):
+    if status_callback:
+        return lambda: status_callback("⏳ 같은 질의를 처리 중인 요청의 결과를 기다리는 중...")
+    return None
+
+
+def get_session(user_query: str, k: int, session: dict = None, status_callback=None, deadline=None) -> dict:
+    """
+    k개의 추천 카드가 채워진 세션을 반환한다.
+
+    session 이 주어지면 그 세션에서 남은 후보만 처리하고, 없으면 새로 검색한다.
+    같은 질의와 k로 동시에 들어온 요청은 한 번만 계산하고 결과를 복사해 공유한다.
+    (기다리던 요청은 자신의 deadline 이 지나거나 취소되면 DeadlineExceeded 를 발생시키고,
+     공유받은 결과가 시간 초과로 끊긴 것이면 남은 시간으로 직접 다시 계산한다)
+    """
+    def compute():
+        new_session = copy.deepcopy(session) if session else create_session(user_query, deadline=deadline)
+        return extend_session(new_session, k, status_callback=status_callback, deadline=deadline)
+
+    result, shared = _in_flight.do(
+        ("session", normalize_query(user_query), k), compute, on_wait=_notify_waiting(status_callback),
+        deadline=deadline, is_partial=lambda shared_session: shared_session["timed_out"],
+    )
+
+    # 공유된 결과는 요청마다 독립적으로 확장할 수 있도록 복사
+    return copy.deepcopy(result) if shared else result
+
+
+def run_lab_recommendation(user_query: str, k: int, status_callback=None, deadline=None):
+    """연구실 추천 실행 함수 (deadline 이 지나면 완성된 추천만 반환)"""
+    def compute():
+        session = create_session(user_query, pool_size=max(k, CANDIDATE_POOL_SIZE), deadline=deadline)
+        extend_session(session, k, status_callback=status_callback, deadline=deadline)
+        return [card["text"] for card in session["cards"][:k]], session["is_web_search"], session["timed_out"]
+
+    (results, is_web_search, _), _ = _in_flight.do(
+        ("run", normalize_query(user_query), k), compute, on_wait=_notify_waiting(status_callback),
+        deadline=deadline, is_partial=lambda result: result[2],
+    )
+    return list(results), is_web_search  # (결과, 웹검색여부)
+
+
+def find_similar_labs(lab_index: int, n: int = 5) -> list[dict]:
+    """
+    미리 계산된 유사도 그래프에서 비슷한 연구실을 찾는다. (임베딩 / LLM 호출 없음)
+    """
+    lab_total_info_df, _ = load_catalog()
+    graph = load_lab_graph()
+    rows = lab_total_info_df.set_index(lab_total_info_df['index'].astype(int))
+
+    results = []
+    for neighbor_index, score in similar_labs(graph, lab_index, n):
+        if neighbor_index not in rows.index:
+            continue
+        row = rows.loc[neighbor_index]
+        results.append({
+            "index": neighbor_index,
+            "lab_name": row.get("lab_name", "Unknown"),
+            "professor_name": row.get("professor_name", "Unknown"),
+            "research_institute": row.get("research_institute", "Unknown"),
+            "department": row.get("department", "Unknown"),
+            "score": score,
+        })
+
+    return results
@@ -1,9 +1,12 @@
 import os
+import threading
 from typing import Dict, List, Any
 from datetime import datetime
 from dotenv import load_dotenv
 from tavily import TavilyClient
 from openai import OpenAI, AzureOpenAI
+from llm_scheduler import get_scheduler, estimate_tokens
+from deadline import DeadlineExceeded, call_timeout
 
 # .env 파일에서 환경변수 로드
 load_dotenv()
@@ -28,20 +31,32 @@ def _init_clients():
         openai_client = AzureOpenAI(
             api_key=OPENAI_API_KEY,
             api_version=OPENAI_API_VERSION,
-            azure_endpoint=AZURE_ENDPOINT
+            azure_endpoint=AZURE_ENDPOINT,
+            max_retries=0  # 재시도는 llm_scheduler 가 담당
         )
         print(f"✅ Azure OpenAI 클라이언트 초기화 완료 (엔드포인트: {AZURE_ENDPOINT})")
     else:
-        openai_client = OpenAI(api_key=OPENAI_API_KEY)
+        openai_client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
         print("✅ OpenAI 클라이언트 초기화 완료")
     
     print("✅ Tavily 클라이언트 초기화 완료")
     return tavily_client, openai_client
 
-# 전역 클라이언트
-tavily_client, openai_client = _init_clients()
+# 전역 클라이언트 (처음 검색할 때 초기화, 부하 테스트에서는 import 후 stub 으로 교체)
+tavily_client = None
+openai_client = None
+_clients_lock = threading.Lock()
 
-def search_web(query: str, max_results: int, status_callback=None) -> Dict[str, Any]:
+
+def _get_clients():
+    """초기화되지 않은 경우에만 API 클라이언트를 만든다. (import 만으로는 API 키가 필요 없음)"""
+    global tavily_client, openai_client
+    with _clients_lock:
+        if tavily_client is None or openai_client is None:
+            tavily_client, openai_client = _init_clients()
+        return tavily_client, openai_client
+
+def search_web(query: str, max_results: int, status_callback=None, deadline=None) -> Dict[str, Any]:
     """
     웹검색 + GPT 분석을 수행하는 메인 함수
     
@@ -53,6 +68,7 @@ def search_web(query: str, max_results: int, status_callback=None) -> Dict[str,
         query (str): 검색할 질의
         max_results (int): 검색 결과 수 (1-10, 기본값: 5)
         include_score (bool): 점수 포함 여부 (기본값: False)
+        deadline (Deadline): 요청 제한 시간 (지나면 남은 호출 없이 빈 리스트 반환)
     
     Returns:
         Dict: {
@@ -77,6 +93,8 @@ def search_web(query: str, max_results: int, status_callback=None) -> Dict[str,
         result = search_web("국내 AI 연구소", max_results=10)
     """
     try:
+        tavily_client, openai_client = _get_clients()
+
         # 1. Tavily로 웹 검색
         if status_callback:
             status_callback(f"🌐 '{query}' 웹 검색 중...")
@@ -88,7 +106,8 @@ def search_web(query: str, max_results: int, status_callback=None) -> Dict[str,
             search_depth="advanced",
             max_results=max_results,
             include_answer=True,
-            include_raw_content=True
+            include_raw_content=True,
+            timeout=call_timeout(deadline, 60)
         )
         
         if status_callback:
@@ -145,11 +164,15 @@ def search_web(query: str, max_results: int, status_callback=None) -> Dict[str,
             }
         ]
         
-        gpt_response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1024,
+        gpt_response = get_scheduler().call(
+            lambda: openai_client.with_options(timeout=call_timeout(deadline, 600)).chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1024,
+            ),
+            estimated_tokens=estimate_tokens(messages, 1024),
+            deadline=deadline,
         )
         
         answer = gpt_response.choices[0].message.content
@@ -167,11 +190,15 @@ def search_web(query: str, max_results: int, status_callback=None) -> Dict[str,
             # GPT에게 k개로 나누어 달라고 요청
             split_prompt = f"다음 내용을 정확히 {max_results}개의 개별 추천으로 나누어 주세요. 각각을 '===추천1===', '===추천2===' 형식으로 구분해 주세요:\n\n{answer}"
             
-            split_response = openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": split_prompt}],
-                temperature=0.3,
-                max_tokens=2048,
+            split_response = get_scheduler().call(
+                lambda: openai_client.with_options(timeout=call_timeout(deadline, 600)).chat.completions.create(
+                    model="gpt-4o",
+                    messages=[{"role": "user", "content": split_prompt}],
+                    temperature=0.3,
+                    max_tokens=2048,
+                ),
+                estimated_tokens=estimate_tokens(split_prompt, 2048),
+                deadline=deadline,
             )
             
             split_answer = split_response.choices[0].message.content
@@ -207,7 +234,14 @@ def search_web(query: str, max_results: int, status_callback=None) -> Dict[str,
             
         return recommendations[:max_results]
         
+    except DeadlineExceeded:
+        print("⏱️ 요청 제한 시간이 지나 웹 검색을 중단합니다.")
+        return []
+
     except Exception as e:
+        # 제한 시간 때문에 외부 호출이 timeout 된 경우
+        if deadline is not None and deadline.expired:
+            return []
         print(f"❌ 오류 발생: {e}")
         # 오류 시에도 k개 리스트 반환
         return [{"index": -1, "lab_info": f"검색 중 오류: {str(e)}", "recommendation_reason": f"검색 중 오류: {str(e)}"}] * max_results
\ No newline at end of file
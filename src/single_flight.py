@@ -0,0 +1,90 @@
+import threading
+from typing import Any, Callable, Hashable, Tuple
+
+from deadline import check_deadline
+
+# 기다리는 동안 취소 여부를 확인하는 간격 (초)
+CANCEL_POLL_INTERVAL = 0.5
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    같은 key 로 동시에 들어온 요청을 하나의 계산으로 합친다.
+
+    처음 들어온 요청(leader)만 fn 을 실행하고, 계산 중에 들어온 같은 key 의 요청은
+    완료를 기다렸다가 결과(또는 예외)를 공유한다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], on_wait: Callable[[], None] = None,
+           deadline=None, is_partial: Callable[[Any], bool] = None) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers with the same key.
+
+        :param on_wait: Called when this caller waits on another caller's computation.
+        :param deadline: This caller's Deadline; a waiting caller raises DeadlineExceeded
+            when it expires or is cancelled, while the leader keeps computing for the others.
+        :param is_partial: Tells whether a result was cut short by the leader's own deadline;
+            a waiting caller with time left then computes again as the new leader instead of sharing it.
+        :return: (result, shared) where shared is True if the result came from another caller.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                is_leader = call is None
+                if is_leader:
+                    call = _Call()
+                    self._calls[key] = call
+
+            if is_leader:
+                return self._run(key, call, fn), False
+
+            if on_wait:
+                on_wait()
+            while not call.done.wait(_wait_timeout(deadline)):
+                check_deadline(deadline)
+
+            if call.error is None:
+                # leader 의 제한 시간 때문에 중간에 끊긴 결과는, 이 요청의 시간이 남아 있으면 다시 계산한다
+                if is_partial is not None and is_partial(call.result) \
+                        and not (deadline is not None and deadline.expired):
+                    continue
+                return call.result, True
+            if isinstance(call.error, Exception):
+                raise call.error
+            # leader 가 중단된 경우(KeyboardInterrupt, Streamlit rerun 등)에는 다시 시도한다
+
+    def _run(self, key: Hashable, call: _Call, fn: Callable[[], Any]):
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def _wait_timeout(deadline) -> float:
+    """deadline 이 없으면 무제한, 있으면 남은 시간 (취소 확인을 위해 최대 CANCEL_POLL_INTERVAL)"""
+    if deadline is None:
+        return None
+    remaining = deadline.remaining()
+    return CANCEL_POLL_INTERVAL if remaining is None else min(remaining, CANCEL_POLL_INTERVAL)
+
+
+def normalize_query(query: str) -> str:
+    """공백과 대소문자만 다른 질의를 같은 질의로 취급한다."""
+    return " ".join(query.split()).lower()
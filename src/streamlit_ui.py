@@ -1,8 +1,20 @@
 import streamlit as st
 import os
+import queue
 import sys
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Dict, List, Any
-import pandas as pd
+from recommendation_session import get_session, is_exhausted, find_similar_labs
+from deadline import Deadline, DeadlineExceeded
+
+# 요청 하나의 최대 처리 시간 (초), 지나면 완성된 추천만 표시
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "120"))
+
+# 추천 처리 중 상태 표시를 갱신하는 간격 (초), 이 간격마다 사용자의 새 요청(rerun)을 확인한다
+STATUS_POLL_INTERVAL = 0.5
+
+# 추천 처리는 별도 스레드에서 (스크립트 스레드는 기다리는 동안 Streamlit 의 중단 요청을 받을 수 있도록)
+_pipeline_executor = ThreadPoolExecutor(max_workers=int(os.getenv("UI_PIPELINE_WORKERS", "16")))
 
 # Streamlit 페이지 설정
 st.set_page_config(
@@ -129,8 +141,10 @@ def init_session_state():
     """세션 상태 초기화"""
     if 'k_value' not in st.session_state:
         st.session_state.k_value = 3
-    if 'search_results' not in st.session_state:
-        st.session_state.search_results = None
+    if 'rec_session' not in st.session_state:
+        st.session_state.rec_session = None  # 후보 풀과 완성된 추천 카드
+    if 'extra_count' not in st.session_state:
+        st.session_state.extra_count = 0  # "더 보기"로 추가한 개수
     if 'user_query' not in st.session_state:
         st.session_state.user_query = ""
 
@@ -152,45 +166,78 @@ def render_result(result: str, index: int):
     </div>
     """, unsafe_allow_html=True)
 
-def run_lab_recommendation(user_query: str, k: int, status_callback=None):
-    """연구실 추천 실행 함수"""
-    from get_docs import get_docs
-    from load_retriever import load_retriever
-    from find_topk import find_topk
-    from lab_recommendation import lab_recommendation
-    from get_result_list import final_prompts_output
-    
-    # 데이터 로드
-    doc_path = "./data/lab_info.xlsx"
-    lab_total_info_df = pd.read_excel(doc_path, engine='openpyxl')
-    lab_search_docs = get_docs(lab_total_info_df)
-    
-    # 검색 모델 로드 및 검색 실행
-    search_model = load_retriever(lab_search_docs, k=k)
-    retrieved_docs = find_topk(search_model, user_query, top_k=k)
-    
-    # 추천 이유 생성 (상태 콜백과 함께)
-    recommend_reason = lab_recommendation(k, user_query, retrieved_docs, status_callback=status_callback)
-    
-    # 최종 결과 생성
-    final_result = []
-    
-    # 웹 검색 결과인지 확인 (리스트이고 첫 번째 항목의 index가 -1)
-    if isinstance(recommend_reason, list) and len(recommend_reason) > 0 and recommend_reason[0].get('index') == -1:
-        # 웹 검색 결과를 final_prompts_output 형태로 변환
-        web_results = []
-        for item in recommend_reason:
-            web_results.append(item.get('recommendation_reason', '추천 결과를 찾을 수 없습니다.'))
-        return web_results, True  # (결과, 웹검색여부)
-    
+def render_similar_labs(lab_index: int):
+    """미리 계산된 그래프에서 비슷한 연구실 표시 (추가 검색 / LLM 호출 없음)"""
+    with st.expander("🔗 이 연구실과 비슷한 연구실"):
+        try:
+            similar = find_similar_labs(lab_index)
+        except Exception as e:
+            st.error(f"❌ 비슷한 연구실을 불러오지 못했습니다: {str(e)}")
+            return
+        if not similar:
+            st.write("비슷한 연구실 정보가 없습니다.")
+        for lab in similar:
+            st.markdown(
+                f"- **{lab['lab_name']}** ({lab['professor_name']}) · "
+                f"{lab['research_institute']} / {lab['department']} · 유사도 {lab['score']:.2f}"
+            )
+
+def resume_session():
+    """시간 초과로 중단된 세션을 사용자가 더 요청하면 이어서 처리하도록 표시"""
+    if st.session_state.get("rec_session"):
+        st.session_state.rec_session["timed_out"] = False
+
+def load_more():
+    """더 보기 버튼: 현재 추천 개수만큼 더 표시"""
+    st.session_state.extra_count += st.session_state.k_value
+    resume_session()
+
+
+def update_results(status_callback=None):
+    """
+    표시할 개수(k + 더 보기)까지 추천 카드를 채운다.
+    세션에 보관된 후보 풀에서 아직 처리하지 않은 후보만 처리하고,
+    다른 사용자가 같은 질의를 처리 중이면 그 결과를 공유받는다.
+    """
+    rec_session = st.session_state.rec_session
+    target = st.session_state.k_value + st.session_state.extra_count
+    if rec_session is not None and len(rec_session["cards"]) >= target:
+        return
+
+    # 이전 실행이 아직 처리 중이면 취소 (rerun 으로 스크립트가 중단되어도 finally 가 실행되지 않을 수 있으므로)
+    previous = st.session_state.get("active_deadline")
+    if previous is not None:
+        previous.cancel()
+    deadline = Deadline(REQUEST_TIMEOUT)
+    st.session_state.active_deadline = deadline
+
+    # 처리는 작업 스레드에서, 상태 메시지는 큐로 받아 스크립트 스레드에서 표시
+    # (Streamlit 호출은 스크립트 스레드에서만 가능하고, 그때마다 사용자의 새 요청을 확인해 RerunException 으로 중단된다)
+    messages = queue.Queue()
+    future = _pipeline_executor.submit(
+        get_session, st.session_state.user_query, target, session=rec_session,
+        status_callback=messages.put, deadline=deadline,
+    )
+    message = "🔄 연구실 추천을 처리하고 있습니다..."
     try:
-        # 일반적인 연구실 추천 결과인 경우
-        final_result = final_prompts_output(recommend_reason, lab_total_info_df)
-    except Exception as e:
-        # 오류 발생 시 기본 메시지 반환
-        final_result = [f"추천 결과 생성 중 오류가 발생했습니다: {str(e)}"]
-    
-    return final_result, False  # (결과, 웹검색여부)
+        while True:
+            try:
+                st.session_state.rec_session = future.result(timeout=STATUS_POLL_INTERVAL)
+                break
+            except FutureTimeoutError:
+                pass
+            while not messages.empty():
+                message = messages.get()
+            if status_callback is not None:
+                status_callback(message)
+    finally:
+        # 사용자가 다시 요청하거나 페이지를 떠나 실행이 중단되면 남은 호출도 취소
+        deadline.cancel()
+        if st.session_state.get("active_deadline") is deadline:
+            st.session_state.active_deadline = None
+
+    if st.session_state.rec_session["timed_out"]:
+        st.warning("⏱️ 처리 시간이 초과되어 완성된 추천만 표시합니다. 더 보려면 다시 시도해주세요.")
 
 def main():
     """Streamlit 메인 앱"""
@@ -221,7 +268,8 @@ def main():
             options=[1, 2, 3, 4, 5],
             index=2,  # 기본값 3
             key="k_selector",
-            label_visibility="collapsed"
+            label_visibility="collapsed",
+            on_change=resume_session
         )
         st.session_state.k_value = k_value
         st.markdown(f"**{k_value}개 추천**")
@@ -231,6 +279,9 @@ def main():
     with col2:
         if st.button("🔍 연구실 추천받기", use_container_width=True):
             if user_query.strip():
+                # 질의가 바뀐 경우에만 후보 풀을 새로 검색
+                rec_session = st.session_state.rec_session
+                is_new_query = rec_session is None or rec_session["user_query"] != user_query
                 st.session_state.user_query = user_query
                 
                 # 초기 검색 스피너
@@ -246,27 +297,28 @@ def main():
                                 status_placeholder.info(message)
                             
                             # 연구실 추천 실행 (상태 콜백 포함)
-                            results, is_web_search = run_lab_recommendation(user_query, st.session_state.k_value, show_status)
+                            if is_new_query:
+                                st.session_state.rec_session = None
+                                st.session_state.extra_count = 0
+                            try:
+                                update_results(show_status)
+                            except DeadlineExceeded:
+                                st.warning("⏱️ 처리 시간이 초과되었습니다. 다시 시도해주세요.")
+                                return
+                            results = st.session_state.rec_session["cards"][:st.session_state.k_value]
                             
                             # 결과 검증
-                            if results is None:
-                                st.error("❌ 추천 결과가 None입니다.")
-                                return
-                            elif not isinstance(results, list):
-                                st.error(f"❌ 예상치 못한 결과 타입: {type(results)}")
-                                return
-                            elif len(results) == 0:
+                            if len(results) == 0:
                                 st.warning("⚠️ 추천 결과가 없습니다.")
                                 return
                             
                             # 웹 검색 결과인 경우 메시지 표시 (정확한 플래그 사용)
-                            if is_web_search:
+                            if st.session_state.rec_session["is_web_search"]:
                                 st.info("🌐 데이터베이스에 적합한 연구실이 없어 웹에서 추가 검색을 진행했습니다.")
                             
                             # 상태 placeholder 정리
                             status_placeholder.empty()
                             
-                            st.session_state.search_results = results
                             st.success(f"✅ {len(results)}개의 연구실을 추천해드립니다!")
                             
                         except Exception as e:
@@ -279,18 +331,44 @@ def main():
                 st.warning("⚠️ 연구 관심사를 입력해주세요.")
     
     # 결과 표시
-    if st.session_state.search_results:
+    rec_session = st.session_state.rec_session
+    if rec_session and rec_session["cards"]:
+        target = st.session_state.k_value + st.session_state.extra_count
+
+        # k를 늘리거나 "더 보기"를 누른 경우 추가된 후보만 처리
+        # (시간 초과로 중단된 세션은 더 보기 / k 변경 / 추천받기 버튼으로 다시 요청했을 때만 이어서 처리)
+        if len(rec_session["cards"]) < target and not is_exhausted(rec_session) and not rec_session["timed_out"]:
+            status_placeholder = st.empty()
+            with st.spinner('🔄 연구실을 더 찾고 있습니다...'):
+                try:
+                    update_results(status_placeholder.info)
+                except Exception as e:
+                    st.error(f"❌ 오류가 발생했습니다: {str(e)}")
+            status_placeholder.empty()
+            rec_session = st.session_state.rec_session
+
+        results = rec_session["cards"][:target]
+
         st.markdown("---")
         st.markdown("## 📋 추천 결과")
         st.markdown(f"**'{st.session_state.user_query}'**에 대한 추천 연구실입니다.")
         
         # 각 결과를 개별 컨테이너로 분리
-        for i, result in enumerate(st.session_state.search_results):
+        for i, card in enumerate(results):
             with st.container():
-                render_result(result, i)
+                render_result(card["text"], i)
+                if card["index"] != -1:
+                    render_similar_labs(card["index"])
                 # 마지막 항목이 아니면 구분선 추가
-                if i < len(st.session_state.search_results) - 1:
+                if i < len(results) - 1:
                     st.markdown("<br>", unsafe_allow_html=True)
+
+        # 더 보기 (남은 후보 또는 아직 보여주지 않은 웹 검색 결과가 있을 때만)
+        has_more = len(rec_session["cards"]) > target or not is_exhausted(rec_session)
+        if has_more:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col2:
+                st.button("➕ 더 보기", use_container_width=True, on_click=load_more)
     
     # 사이드바 정보
     with st.sidebar: